@@ -0,0 +1,174 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from ownership_index import purchased_bond
+
+# Key of the maturity ladder bucket for bonds without a maturity date
+UNDATED = "undated"
+
+
+class PortfolioSummary:
+    """
+    Running aggregates of a set of contracts.
+
+    `by_status` and `maturity_ladder` map a compliance status or maturity
+    year to a [contracts, notional] pair.
+    """
+    __slots__ = ("contracts", "notional", "yield_notional", "weighted_yield", "by_status", "maturity_ladder")
+
+    def __init__(self):
+        self.contracts = 0
+        self.notional = 0.0
+        # Yield is averaged over the contracts that have a yield rate, weighted by amount
+        self.yield_notional = 0.0
+        self.weighted_yield = 0.0
+        self.by_status: Dict[str, List] = {}
+        self.maturity_ladder: Dict[str, List] = {}
+
+    def add(self, amount: float, yield_rate: Optional[float], status: str, year: str) -> None:
+        """Count one more contract."""
+        self.contracts += 1
+        self.notional += amount
+        if yield_rate is not None:
+            self.yield_notional += amount
+            self.weighted_yield += amount * yield_rate
+        _add_to_bucket(self.by_status, status, 1, amount)
+        _add_to_bucket(self.maturity_ladder, year, 1, amount)
+
+    def remove(self, amount: float, yield_rate: Optional[float], status: str, year: str) -> None:
+        """Stop counting a contract."""
+        self.contracts -= 1
+        self.notional -= amount
+        if yield_rate is not None:
+            self.yield_notional -= amount
+            self.weighted_yield -= amount * yield_rate
+        _add_to_bucket(self.by_status, status, -1, -amount)
+        _add_to_bucket(self.maturity_ladder, year, -1, -amount)
+
+    def move(self, amount: float, old_status: str, new_status: str) -> None:
+        """Move one contract between compliance statuses."""
+        _add_to_bucket(self.by_status, old_status, -1, -amount)
+        _add_to_bucket(self.by_status, new_status, 1, amount)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the summary as the JSON body of the analytics endpoints."""
+        return {
+            "contracts": self.contracts,
+            "total_notional": self.notional,
+            "weighted_average_yield": self.weighted_yield / self.yield_notional if self.yield_notional else None,
+            "by_status": {
+                status: {"contracts": count, "notional": notional}
+                for status, (count, notional) in sorted(self.by_status.items())
+            },
+            "maturity_ladder": [
+                {"year": year, "contracts": count, "notional": notional}
+                for year, (count, notional) in sorted(self.maturity_ladder.items())
+            ]
+        }
+
+
+def _add_to_bucket(buckets: Dict[str, List], key: str, count: int, notional: float) -> None:
+    """Add (count, notional) to a bucket, dropping it once it holds no contracts."""
+    bucket = buckets.get(key)
+    if bucket is None:
+        buckets[key] = [count, notional]
+    elif bucket[0] + count:
+        bucket[0] += count
+        bucket[1] += notional
+    else:
+        del buckets[key]
+
+
+class PortfolioAnalytics:
+    """
+    Portfolio aggregates per issuer, per buyer and for the whole market.
+
+    Maintained by the chain's writer as contracts are added and their
+    compliance status changes, so a summary costs the same to read however
+    long the chain is. Like the search index, only contract blocks are
+    counted, and a purchase is not a new contract: it moves the bond it
+    names from buyer 0, which holds the bonds not yet sold, to its buyer
+    (see `transfer`). Updates and reads of the few numbers involved share a
+    short lock, so a summary never shows a half-counted contract.
+    """
+
+    def __init__(self):
+        self.by_issuer: Dict[int, PortfolioSummary] = {}
+        self.by_buyer: Dict[int, PortfolioSummary] = {}
+        self.market = PortfolioSummary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _summary(summaries: Dict[int, PortfolioSummary], user_id: int) -> PortfolioSummary:
+        """Return a user's summary, creating it if missing. Caller holds the lock."""
+        summary = summaries.get(user_id)
+        if summary is None:
+            summary = summaries[user_id] = PortfolioSummary()
+        return summary
+
+    def _summaries(self, block, holder_id: int) -> List[PortfolioSummary]:
+        """Return the summaries a contract counts towards, creating missing ones. Caller holds the lock."""
+        return [self._summary(self.by_issuer, block.issuer_id), self._summary(self.by_buyer, holder_id), self.market]
+
+    @staticmethod
+    def _position(block) -> Tuple[float, Optional[float], str, str]:
+        """Return the amount, yield rate, compliance status and maturity year a contract is counted with."""
+        maturity_date = block.maturity_date
+        year = maturity_date[:4] if maturity_date else UNDATED
+        return block.bond_amount or 0.0, block.yield_rate, block.compliance_status, year
+
+    def add_block(self, block) -> None:
+        """Count a newly appended contract block (purchases are counted by `transfer`)."""
+        if block.index == 0 or purchased_bond(block) is not None:
+            return
+
+        position = self._position(block)
+        with self._lock:
+            for summary in self._summaries(block, block.buyer_id):
+                summary.add(*position)
+
+    def transfer(self, bond, buyer_id: int) -> None:
+        """
+        Move a bond that was sold from buyer 0 to the buyer of its purchase.
+
+        The issuer's and the market's aggregates are unchanged: the bond was
+        already counted when it was issued.
+        """
+        position = self._position(bond)
+        with self._lock:
+            self._summary(self.by_buyer, bond.buyer_id).remove(*position)
+            self._summary(self.by_buyer, buyer_id).add(*position)
+
+    def update_status(self, block, old_status: str, new_status: str, holder_id: Optional[int] = None) -> None:
+        """
+        Move a contract between compliance statuses in every summary it counts towards.
+
+        Args:
+            block: The contract; purchases are not counted, so theirs are ignored
+            old_status: Status the contract is counted with
+            new_status: Status to count it with
+            holder_id: Current holder of the bond (defaults to the contract's buyer)
+        """
+        if old_status == new_status or purchased_bond(block) is not None:
+            return
+
+        amount = block.bond_amount or 0.0
+        with self._lock:
+            for summary in self._summaries(block, block.buyer_id if holder_id is None else holder_id):
+                summary.move(amount, old_status, new_status)
+
+    def _snapshot(self, summary: Optional[PortfolioSummary]) -> Dict[str, Any]:
+        with self._lock:
+            return (summary or PortfolioSummary()).to_dict()
+
+    def market_summary(self) -> Dict[str, Any]:
+        """Return the aggregates of every contract on the chain."""
+        return self._snapshot(self.market)
+
+    def issuer_summary(self, issuer_id: int) -> Dict[str, Any]:
+        """Return the aggregates of the contracts issued by a user (empty if none)."""
+        return self._snapshot(self.by_issuer.get(issuer_id))
+
+    def buyer_summary(self, buyer_id: int) -> Dict[str, Any]:
+        """Return the aggregates of the contracts bought by a user (empty if none)."""
+        return self._snapshot(self.by_buyer.get(buyer_id))
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import struct
+from typing import Any, Callable, Dict, Optional
+
+import merkle
+
+# Block hash versions:
+#   1: JSON of every field, including the full compliance history and metadata
+#   2: JSON of the fixed-size fields plus Merkle roots of the history and metadata
+#   3: Binary canonical encoding of the fields (see `encode_block_v3`) plus the
+#      Merkle root of the history. Metadata is encoded in full rather than
+#      through its Merkle root (unlike version 2): it cannot change once a
+#      block is appended (compliance changes are event blocks), so a root
+#      saves no rehashing, and no proof of a single metadata entry is served
+HASH_VERSION = 3
+
+# Layout of the numeric fields of a version 3 block whose values have their usual types
+NUMBERS_FIXED = struct.Struct(">BBqdqqd")
+NUMBER_TYPES = (int, float, int, int, float)
+INT64 = struct.Struct(">q")
+FLOAT64 = struct.Struct(">d")
+LENGTH = struct.Struct(">I")
+_pack_length = LENGTH.pack
+
+
+def _encode_int(value: int) -> bytes:
+    if -(1 << 63) <= value < (1 << 63):
+        return b"i" + INT64.pack(value)
+    data = value.to_bytes((value.bit_length() + 8) // 8, "big", signed=True)
+    return b"I" + _pack_length(len(data)) + data
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    Encode a JSON-like value as tagged, length-prefixed bytes.
+
+    The encoding is canonical: every value has exactly one encoding, dict
+    entries are ordered by their encoded keys and the type is part of it
+    (1 and 1.0 differ).
+
+    Raises:
+        TypeError: If the value is not None, a bool, number, string, list or dict
+    """
+    # Exact type checks first: this runs for every field of every block hashed
+    kind = type(value)
+    if kind is str:
+        data = value.encode("utf-8", "surrogatepass")
+        return b"s" + _pack_length(len(data)) + data
+    if kind is float:
+        return b"d" + FLOAT64.pack(value)
+    if kind is int:
+        return _encode_int(value)
+    if value is None:
+        return b"n"
+    if kind is bool:
+        return b"t" if value else b"f"
+    if isinstance(value, dict):
+        pairs = []
+        for key, item in value.items():
+            if type(key) is str:
+                key = key.encode("utf-8", "surrogatepass")
+                pairs.append(b"s" + _pack_length(len(key)) + key + encode_value(item))
+            else:
+                pairs.append(encode_value(key) + encode_value(item))
+        # Encoded keys are self-delimiting, so sorting the pairs sorts them by key
+        pairs.sort()
+        return b"m" + _pack_length(len(pairs)) + b"".join(pairs)
+    if isinstance(value, (list, tuple)):
+        return b"l" + _pack_length(len(value)) + b"".join([encode_value(item) for item in value])
+    # Subclasses (enums...) are encoded as their base type
+    if isinstance(value, int):
+        return _encode_int(int(value))
+    if isinstance(value, float):
+        return b"d" + FLOAT64.pack(value)
+    if isinstance(value, str):
+        return encode_value(str.__str__(value))
+    raise TypeError(f"Cannot encode a value of type {type(value).__name__}")
+
+
+def encode_block_v3(fields: Dict[str, Any], history_root: bytes) -> bytes:
+    """
+    Binary canonical encoding of a version 3 block.
+
+    The hash version and a layout byte come first. Index, timestamp, issuer,
+    buyer and bond amount follow as fixed 8-byte big-endian numbers when
+    they have their usual types (layout 0), or tagged as by `encode_value`
+    otherwise (layout 1). Then the yield rate, maturity date, comment,
+    compliance status and previous hash (tagged), the 32-byte history root
+    and the metadata (tagged, keys sorted).
+    """
+    numbers = (fields["index"], fields["timestamp"], fields["issuer_id"], fields["buyer_id"], fields["bond_amount"])
+    if tuple(map(type, numbers)) == NUMBER_TYPES:
+        head = NUMBERS_FIXED.pack(3, 0, *numbers)
+    else:
+        head = bytes((3, 1)) + b"".join(map(encode_value, numbers))
+    return b"".join((
+        head,
+        encode_value(fields["yield_rate"]),
+        encode_value(fields["maturity_date"]),
+        encode_value(fields["comment"]),
+        encode_value(fields["compliance_status"]),
+        encode_value(fields["previous_hash"]),
+        history_root,
+        encode_value(fields["metadata"]),
+    ))
+
+
+def _history_root(fields: Dict[str, Any], history_root: Optional[bytes]) -> bytes:
+    if history_root is not None:
+        return history_root
+    return merkle.merkle_root([merkle.history_leaf(entry) for entry in fields["compliance_history"]])
+
+
+def _hash_v1(fields: Dict[str, Any], history_root: Optional[bytes]) -> str:
+    payload = {name: value for name, value in fields.items()
+               if name not in ("hash", "hash_version")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _hash_v2(fields: Dict[str, Any], history_root: Optional[bytes]) -> str:
+    payload = {name: value for name, value in fields.items()
+               if name not in ("hash", "compliance_history", "metadata")}
+    payload["compliance_history_root"] = _history_root(fields, history_root).hex()
+    payload["metadata_root"] = merkle.merkle_root(merkle.metadata_leaves(fields["metadata"])).hex()
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _hash_v3(fields: Dict[str, Any], history_root: Optional[bytes]) -> str:
+    """Hash the binary encoding of a block; the metadata is encoded in full, not as a Merkle root."""
+    return hashlib.sha256(encode_block_v3(fields, _history_root(fields, history_root))).hexdigest()
+
+
+# Hash function of each block hash version
+HASHERS: Dict[int, Callable[[Dict[str, Any], Optional[bytes]], str]] = {
+    1: _hash_v1,
+    2: _hash_v2,
+    3: _hash_v3,
+}
+
+
+def hash_block_fields(fields: Dict[str, Any], history_root: Optional[bytes] = None) -> str:
+    """
+    Hash a block's field values (as returned by `Block.to_record`), ignoring its hash.
+
+    Args:
+        fields: Block field values; records without a hash_version are version 1
+        history_root: Precomputed Merkle root of the compliance history, used by
+            versions 2 and 3 instead of hashing every entry in `fields`
+
+    Raises:
+        ValueError: If the hash version is unknown
+    """
+    version = fields.get("hash_version", 1)
+    hasher = HASHERS.get(version)
+    if hasher is None:
+        raise ValueError(f"Unsupported block hash version: {version}")
+    return hasher(fields, history_root)
@@ -0,0 +1,551 @@
+import json
+import math
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import merkle
+
+# Fields of a compliance history entry, in the order they are stored
+HISTORY_FIELDS = ("previous_status", "new_status", "timestamp", "reason", "updated_by")
+
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+DATE_PATTERN = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+DIGEST_SIZE = 32
+
+# Marks a value that cannot be represented exactly in its column
+_ODD = object()
+
+
+def _encode_date(value: Optional[str]) -> Any:
+    """Encode a YYYY-MM-DD string as the integer YYYYMMDD (0 for None)."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        match = DATE_PATTERN.match(value)
+        if match and int(match.group(1)) > 0:
+            return int(match.group(1) + match.group(2) + match.group(3))
+    return _ODD
+
+
+def _decode_date(value: int) -> Optional[str]:
+    if value == 0:
+        return None
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+def _encode_history_entry(entry: Dict[str, Any]) -> Union[tuple, Dict[str, Any]]:
+    """Store a history entry as a tuple when it has exactly the standard fields."""
+    if tuple(entry) == HISTORY_FIELDS:
+        return tuple(entry.values())
+    return dict(entry)
+
+
+def _decode_history_entry(entry: Union[tuple, Dict[str, Any]]) -> Dict[str, Any]:
+    if isinstance(entry, tuple):
+        return dict(zip(HISTORY_FIELDS, entry))
+    return dict(entry)
+
+
+def _split_peaks(peaks: bytes) -> List[bytes]:
+    return [peaks[i:i + DIGEST_SIZE] for i in range(0, len(peaks), DIGEST_SIZE)]
+
+
+def _round_trips(value: Any) -> bool:
+    """Return True if `value` decodes back from JSON to an equal object of the same types."""
+    kind = type(value)
+    if kind is str or kind is int or kind is bool or value is None:
+        return True
+    if kind is float:
+        return math.isfinite(value)
+    if kind is list:
+        return all(_round_trips(item) for item in value)
+    if kind is dict:
+        return all(type(key) is str and _round_trips(item) for key, item in value.items())
+    return False
+
+
+class ComplianceState(NamedTuple):
+    """Current compliance status and history of a row, as of one compliance event."""
+    status: Any
+    history_length: int
+    peaks: bytes          # Merkle frontier of the history
+    event_index: int      # Block that committed this state (the row itself before any event)
+
+    @property
+    def history_root(self) -> bytes:
+        """Merkle root of the history, from its frontier in O(log h)."""
+        return merkle.root_from_peaks(_split_peaks(self.peaks))
+
+    def after(self, entry: Dict[str, Any], event_index: int) -> "ComplianceState":
+        """Return the state once `entry` is appended by the event block at `event_index`."""
+        peaks = merkle.append_leaf(_split_peaks(self.peaks), self.history_length, merkle.history_leaf(entry))
+        return ComplianceState(entry["new_status"], self.history_length + 1, b"".join(peaks), event_index)
+
+
+class EncodingCache:
+    """
+    Bounded LRU cache of the JSON encodings of rows (see `Block.to_json`).
+
+    Each entry is kept with the version of the row it encodes, a
+    (hash, compliance state) pair, and only the most recently used
+    `max_entries` rows are kept, so listing the whole chain does not hold
+    an encoding of every block. Readers share it under a short lock.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: Maximum number of cached encodings (0 disables caching)
+        """
+        self.max_entries = max_entries
+        # Row -> ((hash, compliance state) it was encoded at, JSON encoding)
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, Optional[ComplianceState]], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, row: int) -> Optional[Tuple[Tuple[str, Optional[ComplianceState]], bytes]]:
+        """Return the cached (version, encoding) of a row, or None."""
+        with self._lock:
+            entry = self._entries.get(row)
+            if entry is not None:
+                self._entries.move_to_end(row)
+            return entry
+
+    def put(self, row: int, entry: Tuple[Tuple[str, Optional[ComplianceState]], bytes]) -> None:
+        """Cache the (version, encoding) of a row, evicting the least recently used rows."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[row] = entry
+            self._entries.move_to_end(row)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, row: int) -> None:
+        """Drop a row's encoding after the row changed."""
+        with self._lock:
+            self._entries.pop(row, None)
+
+    # Detached copies are pickled for worker processes: leave the entries and the lock behind
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"max_entries": self.max_entries}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["max_entries"])
+
+
+class BlockStore:
+    """
+    Columnar storage for blocks.
+
+    Fixed-width fields live in typed arrays (8 bytes per number, 32 bytes per
+    hash digest) and variable-length fields in side tables: comments as
+    strings, metadata as compact JSON and compliance history as tuples, along
+    with the Merkle frontier of each history so its root is O(log h).
+    The status and history columns hold the values committed by each block's
+    own hash. Compliance events never change them: a bond's current state is
+    an immutable ComplianceState in the sparse `compliance` table, replaced as
+    a whole by each event, and the entries added by events go to append-only
+    lists. Values
+    that a column cannot represent exactly (an int bond amount, a non-ISO
+    maturity date, a hash that is not a SHA-256 hex digest, ...) are kept
+    as-is in an exceptions table, so every block round-trips unchanged and
+    keeps its hash.
+
+    A single writer may append rows and apply compliance events while other
+    threads read: a row becomes visible (counted by `len`) only once all its
+    columns are written, and a reader that takes a row's ComplianceState sees
+    a consistent status, history and root without locking.
+
+    Rows are exposed as lightweight views of `view_class`, which must accept
+    `(store, row)` through its `_view` constructor.
+    """
+
+    def __init__(self, view_class, cache_size: int = 1024):
+        """
+        Args:
+            view_class: Class of the views returned for rows (see `Block._view`)
+            cache_size: Maximum number of rows whose JSON encoding is cached
+        """
+        self.view_class = view_class
+
+        self.indexes = array("q")
+        self.timestamps = array("d")
+        self.issuer_ids = array("q")
+        self.buyer_ids = array("q")
+        self.bond_amounts = array("d")
+        self.yield_rates = array("d")       # NaN when the yield rate is None
+        self.maturity_dates = array("i")    # YYYYMMDD, 0 when None
+        self.status_codes = array("B")
+        self.hashes = bytearray()
+        self.previous_hashes = bytearray()
+        self.hash_versions = array("B")
+
+        self.comments: List[str] = []
+        self.metadata: List[Optional[str]] = []
+        self.histories: List[Union[tuple, list]] = []
+        self.history_peaks: List[bytes] = []  # Merkle frontier of each history
+        self.encoded = EncodingCache(cache_size)
+
+        # Row -> current compliance state and the history entries appended by
+        # its compliance events, for rows that received any
+        self.compliance: Dict[int, ComplianceState] = {}
+        self.event_entries: Dict[int, List[Union[tuple, Dict[str, Any]]]] = {}
+
+        self.status_names: List[str] = []
+        self.status_codes_by_name: Dict[str, int] = {}
+        self.exceptions: Dict[Tuple[int, str], Any] = {}
+
+        # Number of fully written rows, published after every column is appended
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return [self.view_class._view(self, row) for row in range(*key.indices(len(self)))]
+        row = key + len(self) if key < 0 else key
+        if not 0 <= row < len(self):
+            raise IndexError("block index out of range")
+        return self.view_class._view(self, row)
+
+    def __iter__(self) -> Iterator:
+        for row in range(len(self)):
+            yield self.view_class._view(self, row)
+
+    def append(self, block) -> None:
+        """Copy a block into this store and rebind it as a view of the new row."""
+        source, row = block._store, block._row
+        new_row = len(self)
+        start, end = row * DIGEST_SIZE, (row + 1) * DIGEST_SIZE
+
+        self.indexes.append(source.indexes[row])
+        self.timestamps.append(source.timestamps[row])
+        self.issuer_ids.append(source.issuer_ids[row])
+        self.buyer_ids.append(source.buyer_ids[row])
+        self.bond_amounts.append(source.bond_amounts[row])
+        self.yield_rates.append(source.yield_rates[row])
+        self.maturity_dates.append(source.maturity_dates[row])
+        self.hashes += source.hashes[start:end]
+        self.previous_hashes += source.previous_hashes[start:end]
+        self.hash_versions.append(source.hash_versions[row])
+        self.comments.append(source.comments[row])
+        self.metadata.append(source.metadata[row])
+        self.histories.append(source.histories[row])
+        self.history_peaks.append(source.history_peaks[row])
+        cached = source.encoded.get(row)
+        if cached is not None:
+            self.encoded.put(new_row, cached)
+
+        self.status_codes.append(0)
+        if (row, "compliance_status") not in source.exceptions:
+            self._set_status(new_row, source.status_names[source.status_codes[row]])
+
+        for name in _FIELDS:
+            if (row, name) in source.exceptions:
+                self.exceptions[(new_row, name)] = source.exceptions[(row, name)]
+        self._length = new_row + 1
+
+        block._store = self
+        block._row = new_row
+
+    def append_row(self, **fields: Any) -> int:
+        """Append a row from decoded field values and return its position."""
+        row = len(self)
+        self.indexes.append(0)
+        self.timestamps.append(0.0)
+        self.issuer_ids.append(0)
+        self.buyer_ids.append(0)
+        self.bond_amounts.append(0.0)
+        self.yield_rates.append(math.nan)
+        self.maturity_dates.append(0)
+        self.status_codes.append(0)
+        self.hashes.extend(bytes(DIGEST_SIZE))
+        self.previous_hashes.extend(bytes(DIGEST_SIZE))
+        self.hash_versions.append(1)
+        self.comments.append("")
+        self.metadata.append(None)
+        self.histories.append(())
+        self.history_peaks.append(b"")
+
+        for name, value in fields.items():
+            if _FIELDS[name][1](self, row, value) is _ODD:
+                self.exceptions[(row, name)] = value
+        self._length = row + 1
+        return row
+
+    def get_row(self, row: int, include_history: bool = True) -> Dict[str, Any]:
+        """
+        Return every field of a row as decoded values, with its current compliance state.
+        
+        Args:
+            row: Row to read
+            include_history: Decode the compliance history, which costs O(h)
+        """
+        state = self.compliance.get(row)
+        values = self.get_committed_row(row, include_history)
+        if state is not None:
+            values["compliance_status"] = state.status
+            if include_history:
+                values["compliance_history"] += self._event_history(row, state)
+        return values
+
+    def get_committed_row(self, row: int, include_history: bool = True) -> Dict[str, Any]:
+        """
+        Return the field values covered by a row's hash, leaving out compliance events.
+        
+        Args:
+            row: Row to read
+            include_history: Decode the compliance history, which costs O(h)
+        """
+        start, end = row * DIGEST_SIZE, (row + 1) * DIGEST_SIZE
+        yield_rate = self.yield_rates[row]
+        metadata = self.metadata[row]
+
+        values = {
+            "index": self.indexes[row],
+            "timestamp": self.timestamps[row],
+            "issuer_id": self.issuer_ids[row],
+            "buyer_id": self.buyer_ids[row],
+            "comment": self.comments[row],
+            "previous_hash": self.previous_hashes[start:end].hex(),
+            "bond_amount": self.bond_amounts[row],
+            "maturity_date": _decode_date(self.maturity_dates[row]),
+            "yield_rate": None if yield_rate != yield_rate else yield_rate,
+            "compliance_status": self._get_status(row),
+            "metadata": {} if metadata is None else json.loads(metadata),
+            "hash": self.hashes[start:end].hex(),
+            "hash_version": self.hash_versions[row]
+        }
+        if include_history:
+            values["compliance_history"] = self._get_history(row)
+
+        if self.exceptions:
+            for name in values:
+                if (row, name) in self.exceptions:
+                    values[name] = self.exceptions[(row, name)]
+        return values
+
+    def committed_slice(self, start: int, end: int) -> "BlockStore":
+        """
+        Return a detached copy of rows [start, end), renumbered from 0.
+
+        Only what `get_committed_row` reads is copied (compliance events are
+        left out), so the copy is cheap to pickle and answers
+        `get_committed_row(row - start)` like this store. It has no views.
+        """
+        part = BlockStore(None)
+        for column in ("indexes", "timestamps", "issuer_ids", "buyer_ids", "bond_amounts",
+                       "yield_rates", "maturity_dates", "status_codes", "hash_versions"):
+            setattr(part, column, getattr(self, column)[start:end])
+        part.hashes = self.hashes[start * DIGEST_SIZE:end * DIGEST_SIZE]
+        part.previous_hashes = self.previous_hashes[start * DIGEST_SIZE:end * DIGEST_SIZE]
+        part.comments = self.comments[start:end]
+        part.metadata = self.metadata[start:end]
+        part.histories = self.histories[start:end]
+        part.history_peaks = self.history_peaks[start:end]
+        part.status_names = list(self.status_names)
+        if self.exceptions:
+            part.exceptions = {
+                (row - start, name): value
+                for (row, name), value in list(self.exceptions.items()) if start <= row < end
+            }
+        part._length = end - start
+        return part
+
+    def _event_history(self, row: int, state: ComplianceState) -> List[Dict[str, Any]]:
+        """Decode the entries appended by compliance events, up to `state`."""
+        count = state.history_length - len(self.histories[row])
+        return [_decode_history_entry(entry) for entry in self.event_entries[row][:count]]
+
+    def compliance_state(self, row: int) -> ComplianceState:
+        """Return the current compliance state of a row."""
+        state = self.compliance.get(row)
+        if state is None:
+            state = ComplianceState(
+                self.get(row, "compliance_status"), len(self.histories[row]), self.history_peaks[row], row
+            )
+        return state
+
+    def history(self, row: int, state: ComplianceState) -> List[Dict[str, Any]]:
+        """Return a row's compliance history as of `state`."""
+        history = self._get_history(row)
+        if state.history_length > len(history):
+            history += self._event_history(row, state)
+        return history
+
+    def history_root(self, row: int) -> bytes:
+        """Merkle root of a row's current compliance history, from its frontier in O(log h)."""
+        return self.compliance_state(row).history_root
+
+    def committed_history_root(self, row: int) -> bytes:
+        """Merkle root of the compliance history covered by the row's own hash."""
+        return merkle.root_from_peaks(_split_peaks(self.history_peaks[row]))
+
+    def get(self, row: int, name: str) -> Any:
+        """Return the decoded value of a field (the current state for compliance fields)."""
+        if self.compliance and name in _COMPLIANCE_FIELDS:
+            state = self.compliance.get(row)
+            if state is not None:
+                if name == "compliance_status":
+                    return state.status
+                return self.history(row, state)
+        if self.exceptions and (row, name) in self.exceptions:
+            return self.exceptions[(row, name)]
+        return _FIELDS[name][0](self, row)
+
+    def set(self, row: int, name: str, value: Any) -> None:
+        """Encode and store a committed field value, falling back to the exceptions table."""
+        self.encoded.discard(row)
+        if _FIELDS[name][1](self, row, value) is _ODD:
+            self.exceptions[(row, name)] = value
+        elif self.exceptions:
+            self.exceptions.pop((row, name), None)
+
+    def append_history_entry(self, row: int, entry: Dict[str, Any]) -> None:
+        """Append a single entry to a row's committed compliance history."""
+        self.encoded.discard(row)
+        history = self.histories[row]
+        self.history_peaks[row] = b"".join(merkle.append_leaf(
+            _split_peaks(self.history_peaks[row]), len(history), merkle.history_leaf(entry)
+        ))
+        self.histories[row] = history + (_encode_history_entry(entry),)
+
+    def apply_compliance_event(self, row: int, entry: Dict[str, Any], state: ComplianceState) -> None:
+        """
+        Move a row's current status and history on by one compliance event.
+        
+        Args:
+            row: Row the event applies to
+            entry: History entry added by the event
+            state: `compliance_state(row).after(entry, ...)`, published once
+                the entry is stored, so readers never see half an event
+        """
+        self.event_entries.setdefault(row, []).append(_encode_history_entry(entry))
+        self.compliance[row] = state
+
+    # Column accessors: each setter returns _ODD for values it cannot store
+
+    def _get_yield_rate(self, row):
+        value = self.yield_rates[row]
+        return None if math.isnan(value) else value
+
+    def _set_yield_rate(self, row, value):
+        if value is None:
+            self.yield_rates[row] = math.nan
+        elif type(value) is float and not math.isnan(value):
+            self.yield_rates[row] = value
+        else:
+            return _ODD
+
+    def _get_maturity_date(self, row):
+        return _decode_date(self.maturity_dates[row])
+
+    def _set_maturity_date(self, row, value):
+        encoded = _encode_date(value)
+        if encoded is _ODD:
+            return _ODD
+        self.maturity_dates[row] = encoded
+
+    def _get_status(self, row):
+        code = self.status_codes[row]
+        # Rows whose status lives in the exceptions table may have no valid code
+        return self.status_names[code] if code < len(self.status_names) else None
+
+    def _set_status(self, row, value):
+        if type(value) is not str:
+            return _ODD
+        code = self.status_codes_by_name.get(value)
+        if code is None:
+            if len(self.status_names) >= 256:
+                return _ODD
+            code = self.status_codes_by_name[value] = len(self.status_names)
+            self.status_names.append(value)
+        self.status_codes[row] = code
+
+    def _get_comment(self, row):
+        return self.comments[row]
+
+    def _set_comment(self, row, value):
+        if type(value) is not str:
+            return _ODD
+        self.comments[row] = value
+
+    def _get_metadata(self, row):
+        encoded = self.metadata[row]
+        return {} if encoded is None else json.loads(encoded)
+
+    def _set_metadata(self, row, value):
+        if value is None or value == {}:
+            self.metadata[row] = None
+            return
+        if not _round_trips(value):
+            return _ODD
+        self.metadata[row] = json.dumps(value, separators=(",", ":"))
+
+    def _get_history(self, row):
+        return [_decode_history_entry(entry) for entry in self.histories[row]]
+
+    def _set_history(self, row, value):
+        self.histories[row] = ()
+        self.history_peaks[row] = b""
+        for entry in value or []:
+            self.append_history_entry(row, entry)
+
+
+def _number_column(column: str, kind: type):
+    """Accessors for a typed array column holding values of exactly `kind`."""
+    def getter(store, row):
+        return getattr(store, column)[row]
+
+    def setter(store, row, value):
+        if type(value) is not kind:
+            return _ODD
+        try:
+            getattr(store, column)[row] = value
+        except OverflowError:
+            return _ODD
+
+    return getter, setter
+
+
+def _digest_column(column: str):
+    """Accessors for a column of SHA-256 hex digests stored as raw bytes."""
+    def getter(store, row):
+        start = row * DIGEST_SIZE
+        return getattr(store, column)[start:start + DIGEST_SIZE].hex()
+
+    def setter(store, row, value):
+        if type(value) is not str or not HASH_PATTERN.match(value):
+            return _ODD
+        start = row * DIGEST_SIZE
+        getattr(store, column)[start:start + DIGEST_SIZE] = bytes.fromhex(value)
+
+    return getter, setter
+
+
+_COMPLIANCE_FIELDS = ("compliance_status", "compliance_history")
+
+# Field name -> (getter, setter) on BlockStore
+_FIELDS = {
+    "index": _number_column("indexes", int),
+    "timestamp": _number_column("timestamps", float),
+    "issuer_id": _number_column("issuer_ids", int),
+    "buyer_id": _number_column("buyer_ids", int),
+    "comment": (BlockStore._get_comment, BlockStore._set_comment),
+    "previous_hash": _digest_column("previous_hashes"),
+    "bond_amount": _number_column("bond_amounts", float),
+    "maturity_date": (BlockStore._get_maturity_date, BlockStore._set_maturity_date),
+    "yield_rate": (BlockStore._get_yield_rate, BlockStore._set_yield_rate),
+    "compliance_status": (BlockStore._get_status, BlockStore._set_status),
+    "compliance_history": (BlockStore._get_history, BlockStore._set_history),
+    "metadata": (BlockStore._get_metadata, BlockStore._set_metadata),
+    "hash": _digest_column("hashes"),
+    "hash_version": _number_column("hash_versions", int),
+}
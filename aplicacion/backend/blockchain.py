@@ -1,10 +1,26 @@
-import hashlib
 import json
+import queue
+import threading
 import time
-from typing import List, Dict, Any, Optional, Union
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Tuple, Union
 from datetime import datetime
 from sqlalchemy.orm import Session
-from models import User
+from user_cache import user_cache
+from change_notifier import ChangeNotifier, change_notifier
+from config import config
+from ledger_store import LedgerStore, LedgerCorruptionError
+from search_index import SearchIndex
+from analytics import PortfolioAnalytics
+from transaction_graph import TransactionGraph
+from timeline_index import TimelineIndex
+from text_index import TextIndex
+from ownership_index import ORIGINAL_BOND_KEY, OwnershipIndex, purchased_bond
+from block_store import BlockStore, ComplianceState
+from block_hash import HASH_VERSION, hash_block_fields
+import merkle
 
 # Compliance status options
 class ComplianceStatus:
@@ -14,7 +30,62 @@ class ComplianceStatus:
     UNDER_REVIEW = "under_review"
 
 
+# Metadata "event" value marking a block that records a compliance status
+# change of an earlier bond instead of a new contract
+COMPLIANCE_EVENT = "compliance_update"
+
+class BatchValidationError(ValueError):
+    """Raised when items of a batch fail validation; `errors` lists each failure."""
+    
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} item(s) of the batch are invalid; nothing was added")
+        self.errors = errors
+
+
+def _stored_field(name: str) -> property:
+    """Property reading and writing one field of the block's row in its BlockStore."""
+    return property(
+        lambda self: self._store.get(self._row, name),
+        lambda self, value: self._store.set(self._row, name, value)
+    )
+
+
 class Block:
+    """
+    A block of the chain, stored as a lightweight view of a BlockStore row.
+    
+    A newly constructed block owns a private single-row store; appending it
+    to a chain copies it into the chain's store and rebinds the view. In the
+    chain's store, `compliance_status` and `compliance_history` reflect the
+    compliance events applied to the bond since it was added. Field
+    values are returned as fresh objects, so mutating `compliance_history`
+    or `metadata` changes nothing. Blocks in a chain are never rewritten:
+    compliance changes go through `Blockchain.update_compliance_status`,
+    which appends an event block.
+    """
+    __slots__ = ("_store", "_row")
+    
+    index = _stored_field("index")
+    timestamp = _stored_field("timestamp")
+    issuer_id = _stored_field("issuer_id")
+    buyer_id = _stored_field("buyer_id")
+    comment = _stored_field("comment")
+    previous_hash = _stored_field("previous_hash")
+    
+    # Bond-specific details
+    bond_amount = _stored_field("bond_amount")
+    maturity_date = _stored_field("maturity_date")
+    yield_rate = _stored_field("yield_rate")
+    
+    # Compliance tracking
+    compliance_status = _stored_field("compliance_status")
+    compliance_history = _stored_field("compliance_history")
+    
+    # Additional metadata
+    metadata = _stored_field("metadata")
+    hash = _stored_field("hash")
+    hash_version = _stored_field("hash_version")
+    
     def __init__(
         self,
         index: int,
@@ -29,101 +100,102 @@ class Block:
         compliance_status: str = ComplianceStatus.PENDING,
         compliance_history: Optional[List[Dict[str, Any]]] = None,
         metadata: Optional[Dict[str, Any]] = None,
-        hash: Optional[str] = None
+        hash: Optional[str] = None,
+        hash_version: int = HASH_VERSION
     ):
-        self.index = index
-        self.timestamp = timestamp
-        self.issuer_id = issuer_id
-        self.buyer_id = buyer_id
-        self.comment = comment
-        self.previous_hash = previous_hash
-        
-        # Bond-specific details
-        self.bond_amount = bond_amount
-        self.maturity_date = maturity_date
-        self.yield_rate = yield_rate
-        
-        # Compliance tracking
-        self.compliance_status = compliance_status
-        self.compliance_history = compliance_history or []
-        
-        # Additional metadata
-        self.metadata = metadata or {}
+        self._store = BlockStore(Block, cache_size=1)
+        self._row = self._store.append_row(
+            index=index,
+            timestamp=timestamp,
+            issuer_id=issuer_id,
+            buyer_id=buyer_id,
+            comment=comment,
+            previous_hash=previous_hash,
+            bond_amount=bond_amount,
+            maturity_date=maturity_date,
+            yield_rate=yield_rate,
+            compliance_status=compliance_status,
+            compliance_history=compliance_history or [],
+            metadata=metadata or {},
+            hash_version=hash_version
+        )
         
         # Calculate hash based on all block contents
         self.hash = hash or self.calculate_hash()
     
-    def calculate_hash(self) -> str:
-        """Calculate the hash of the block based on its contents."""
-        block_string = json.dumps({
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "issuer_id": self.issuer_id,
-            "buyer_id": self.buyer_id,
-            "comment": self.comment,
-            "bond_amount": self.bond_amount,
-            "maturity_date": self.maturity_date,
-            "yield_rate": self.yield_rate,
-            "compliance_status": self.compliance_status,
-            "compliance_history": self.compliance_history,
-            "metadata": self.metadata,
-            "previous_hash": self.previous_hash
-        }, sort_keys=True).encode()
-        
-        return hashlib.sha256(block_string).hexdigest()
-    
-    def update_compliance_status(self, new_status: str, reason: str, updated_by: int) -> None:
-        """
-        Update the compliance status of the bond and record the change in history.
+    @classmethod
+    def _view(cls, store: BlockStore, row: int) -> "Block":
+        """Return a view of an existing row of a BlockStore."""
+        block = cls.__new__(cls)
+        block._store = store
+        block._row = row
+        return block
+    
+    def calculate_hash(self, deep: bool = False) -> str:
+        """
+        Calculate the hash of the block based on its contents.
+        
+        The block's hash version picks the encoding hashed (see block_hash).
+        From version 2 on, the compliance history enters the hash through
+        its Merkle root, taken from the stored frontier in O(log h). Status
+        changes applied by later compliance events are not part of the hash.
         
         Args:
-            new_status: New compliance status (from ComplianceStatus class)
-            reason: Reason for the status change
-            updated_by: ID of the user who updated the status
+            deep: Rebuild the history Merkle root from the entries themselves
+                instead of trusting the stored frontier (used by full audits)
         """
-        if new_status not in [ComplianceStatus.PENDING, ComplianceStatus.COMPLIANT,
-                             ComplianceStatus.NON_COMPLIANT, ComplianceStatus.UNDER_REVIEW]:
-            raise ValueError(f"Invalid compliance status: {new_status}")
+        if deep or self.hash_version == 1:
+            return hash_block_fields(self._store.get_committed_row(self._row))
         
-        # Add current status to history
-        self.compliance_history.append({
-            "previous_status": self.compliance_status,
-            "new_status": new_status,
-            "timestamp": time.time(),
-            "reason": reason,
-            "updated_by": updated_by
-        })
-        
-        # Update current status
-        self.compliance_status = new_status
+        return hash_block_fields(
+            self._store.get_committed_row(self._row, include_history=False),
+            history_root=self._store.committed_history_root(self._row)
+        )
+    
+    def append_history_entry(self, entry: Dict[str, Any]) -> None:
+        """Append an entry to the compliance history without rehashing (legacy ledger replay only)."""
+        self._store.append_history_entry(self._row, entry)
+    
+    def to_json(self) -> bytes:
+        """
+        Return the JSON encoding of `to_dict()`.
         
-        # Recalculate hash
-        self.hash = self.calculate_hash()
+        The encoding is cached and reused until the block's hash or its
+        compliance state changes, which happens on every modification of the
+        block's contents and every compliance event applied to it. Only the
+        most recently used `BLOCK_JSON_CACHE_SIZE` blocks keep theirs.
+        """
+        cached = self._store.encoded.get(self._row)
+        version = (self.hash, self._store.compliance.get(self._row))
+        if cached is None or cached[0] != version:
+            cached = (version, json.dumps(self.to_dict(), separators=(",", ":")).encode())
+            self._store.encoded.put(self._row, cached)
+        return cached[1]
     
-    def add_metadata(self, key: str, value: Any) -> None:
-        """Add or update metadata for the block."""
-        self.metadata[key] = value
-        self.hash = self.calculate_hash()
+    def to_record(self) -> Dict[str, Any]:
+        """Convert block to a dictionary of the raw field values covered by its hash."""
+        return self._store.get_committed_row(self._row)
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert block to dictionary for JSON serialization."""
+        block = self._store.get_row(self._row)
         return {
-            "index": self.index,
-            "timestamp": timestamp_to_string(self.timestamp),
-            "issuer_id": self.issuer_id,
-            "buyer_id": self.buyer_id,
-            "comment": self.comment,
-            "bond_amount": self.bond_amount,
-            "maturity_date": self.maturity_date,
-            "yield_rate": self.yield_rate,
-            "compliance_status": self.compliance_status,
+            "index": block["index"],
+            "timestamp": timestamp_to_string(block["timestamp"]),
+            "issuer_id": block["issuer_id"],
+            "buyer_id": block["buyer_id"],
+            "comment": block["comment"],
+            "bond_amount": block["bond_amount"],
+            "maturity_date": block["maturity_date"],
+            "yield_rate": block["yield_rate"],
+            "compliance_status": block["compliance_status"],
             "compliance_history": [
                 {**history, "timestamp": timestamp_to_string(history["timestamp"])}
-                for history in self.compliance_history
+                for history in block["compliance_history"]
             ],
-            "metadata": self.metadata,
-            "previous_hash": self.previous_hash,
-            "hash": self.hash
+            "metadata": block["metadata"],
+            "previous_hash": block["previous_hash"],
+            "hash": block["hash"]
         }
 
 
@@ -132,11 +204,108 @@ def timestamp_to_string(ts: float) -> str:
     return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
 
 
+class _WriteTail:
+    """
+    The chain tip as seen by the writer thread while it builds a group of writes.
+    
+    Blocks built by earlier writes of the group are not in the chain yet, so
+    later writes chain onto them through `latest` and see the compliance
+    states and bond holders they produce through `compliance_state` and
+    `owner_of`.
+    """
+    
+    def __init__(self, chain: BlockStore, ownership: OwnershipIndex):
+        self.chain = chain
+        self.ownership = ownership
+        self.latest: Block = chain[-1]
+        self.blocks: List[Block] = []
+        self.states: Dict[int, ComplianceState] = {}
+        self.owners: Dict[int, int] = {}
+    
+    def compliance_state(self, row: int) -> ComplianceState:
+        """Return the compliance state of a contract, including pending events."""
+        state = self.states.get(row)
+        return state if state is not None else self.chain.compliance_state(row)
+    
+    def owner_of(self, bond_index: Any) -> Optional[int]:
+        """Return the holder of an issued bond, including pending contracts (None if it is not one)."""
+        owner = self.owners.get(bond_index) if type(bond_index) is int else None
+        return owner if owner is not None else self.ownership.owner_of(bond_index)
+    
+    def append(self, block: Block) -> None:
+        """Add a block to the group."""
+        self.blocks.append(block)
+        self.latest = block
+    
+    def append_contract(self, block: Block) -> None:
+        """Add a contract block to the group, recording the bond it issues or purchases."""
+        bond_index = purchased_bond(block)
+        self.owners[block.index if bond_index is None else bond_index] = block.buyer_id
+        self.append(block)
+    
+    def checkpoint(self) -> Tuple[Block, int, Dict[int, ComplianceState], Dict[int, int]]:
+        return self.latest, len(self.blocks), dict(self.states), dict(self.owners)
+    
+    def rollback(self, checkpoint: Tuple[Block, int, Dict[int, ComplianceState], Dict[int, int]]) -> None:
+        """Drop everything a failed write added since `checkpoint`."""
+        self.latest, count, self.states, self.owners = checkpoint
+        del self.blocks[count:]
+
+
 class Blockchain:
-    def __init__(self):
-        """Initialize a new blockchain with a genesis block."""
-        self.chain: List[Block] = []
-        self.create_genesis_block()
+    def __init__(self, store: Optional[LedgerStore] = None, notifier: Optional[ChangeNotifier] = None):
+        """
+        Initialize the blockchain.
+        
+        Args:
+            store: Durable ledger store. When it already holds records the chain
+                is replayed from it, otherwise a new genesis block is created.
+                Without a store the chain lives only in memory.
+            notifier: Change notifier shared with the other processes using the
+                store. Each write bumps its "ledger" channel, and bumps by
+                other processes make this chain read their new records.
+        """
+        self.chain = BlockStore(Block, cache_size=config.BLOCK_JSON_CACHE_SIZE)
+        self.store = store
+        self.notifier = notifier
+        self.search_index = SearchIndex()
+        self.analytics = PortfolioAnalytics()
+        self.graph = TransactionGraph(self.chain, self.search_index)
+        self.timeline = TimelineIndex()
+        self.ownership = OwnershipIndex()
+        self.text_index = TextIndex()
+        
+        # Validation watermark: every block up to this index has had its hash
+        # and previous_hash link verified. Blocks modified after they were
+        # verified are tracked as dirty until the next validation.
+        self._verified_upto = 0
+        self._dirty: Set[int] = set()
+        
+        # Writes are queued to a single writer thread (started on first use),
+        # which appends them in order; readers never take a lock
+        self._writes: "queue.Queue[Optional[Tuple[Callable[[_WriteTail], Any], Future]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+        
+        # Serializes validations, which move the verified watermark
+        self._validation_lock = threading.Lock()
+        
+        # Set while a catch-up with other processes' writes is queued
+        self._refresh_queued = False
+        
+        with self._exclusive():
+            if store is not None and store.has_data():
+                self._load_from_store()
+            else:
+                self.create_genesis_block()
+        
+        if notifier is not None:
+            notifier.subscribe("ledger", self._on_ledger_change)
+    
+    def _exclusive(self):
+        """Context holding the ledger store's inter-process write lock, if there is a store."""
+        return self.store.exclusive() if self.store is not None else nullcontext()
     
     def create_genesis_block(self) -> None:
         """Create the first block in the chain (genesis block)."""
@@ -149,7 +318,257 @@ class Blockchain:
             previous_hash="0",
             metadata={"is_genesis": True}
         )
-        self.chain.append(genesis_block)
+        self._append_block(genesis_block)
+    
+    def _load_from_store(self) -> None:
+        """
+        Rebuild the chain by replaying the ledger store, verifying every hash.
+        
+        Raises:
+            LedgerCorruptionError: If a record is out of sequence or a hash does not match
+        """
+        for record in self.store.replay():
+            self._replay_record(record)
+            
+            # Blocks are verified as they load, so the watermark follows the tail
+            self._verified_upto = len(self.chain) - 1
+        
+        if not self.chain:
+            # Only an incomplete first write was logged before a crash
+            self.create_genesis_block()
+    
+    def _replay_record(self, record: Dict[str, Any]) -> None:
+        """
+        Apply one ledger store record to the chain, verifying its hashes.
+        
+        Raises:
+            LedgerCorruptionError: If the record is out of sequence or a hash does not match
+        """
+        if record["type"] == "block":
+            self._load_block(record["block"])
+        
+        elif record["type"] == "batch":
+            for fields in record["blocks"]:
+                self._load_block(fields)
+        
+        elif record["type"] == "compliance":
+            # In-place update written before compliance events were blocks
+            index = record["index"]
+            if not 0 < index < len(self.chain):
+                raise LedgerCorruptionError(f"Compliance event for unknown block {index}")
+            block = self.chain[index]
+            old_status = block.compliance_status
+            block.append_history_entry(record["entry"])
+            block.compliance_status = record["entry"]["new_status"]
+            block.hash = block.calculate_hash()
+            if block.hash != record["hash"]:
+                raise LedgerCorruptionError(f"Hash mismatch replaying compliance event for block {index}")
+            self.mark_dirty(index)
+            self._apply_status_change(block, old_status)
+        
+        else:
+            raise LedgerCorruptionError(f"Unknown ledger record type: {record['type']}")
+    
+    def _load_block(self, fields: Dict[str, Any]) -> None:
+        """Verify a replayed block record and append it to the chain."""
+        fields.setdefault("hash_version", 1)
+        index = fields["index"]
+        if index != len(self.chain):
+            raise LedgerCorruptionError(f"Expected block {len(self.chain)} but found block {index}")
+        if fields["hash"] != hash_block_fields(fields):
+            raise LedgerCorruptionError(f"Hash mismatch for block {index}")
+        if index > 0 and fields["previous_hash"] != self.chain[index - 1].hash:
+            raise LedgerCorruptionError(f"Broken previous_hash link at block {index}")
+        
+        # Decode straight into the chain's store, skipping a detached Block
+        self._index_block(self.chain[self.chain.append_row(**fields)])
+    
+    def _apply_block(self, block: Block) -> None:
+        """Append a block to the in-memory chain and its indexes."""
+        self.chain.append(block)
+        self._index_block(block)
+    
+    def _index_block(self, block: Block) -> None:
+        """Add a block that is already in the chain to the indexes or the compliance view."""
+        if block.index > 0 and block.metadata.get("event") == COMPLIANCE_EVENT:
+            self._apply_compliance_event(block)
+        else:
+            self.search_index.add_block(block)
+            self.ownership.add_block(block)
+            self.analytics.add_block(block)
+            bond_index = purchased_bond(block)
+            if bond_index is not None and self.ownership.purchases.get(bond_index) == block.index:
+                self.analytics.transfer(self.chain[bond_index], block.buyer_id)
+            self.timeline.add_block(block)
+            self.text_index.add_block(block)
+    
+    def _apply_compliance_event(self, event: Block) -> None:
+        """
+        Fold a compliance event block into its bond's current status and history.
+        
+        Raises:
+            LedgerCorruptionError: If the event targets an unknown bond or does
+                not match the bond's history
+        """
+        metadata = event.metadata
+        bond_index = metadata.get("bond_index")
+        if type(bond_index) is not int or not self.search_index.is_contract(bond_index):
+            raise LedgerCorruptionError(
+                f"Compliance event {event.index} targets unknown contract {bond_index}"
+            )
+        
+        entry = event.compliance_history[0]
+        old_state = self.chain.compliance_state(bond_index)
+        state = old_state.after(entry, event.index)
+        if state.history_root.hex() != metadata.get("history_root"):
+            raise LedgerCorruptionError(
+                f"Compliance event {event.index} does not match the history of contract {bond_index}"
+            )
+        
+        self.chain.apply_compliance_event(bond_index, entry, state)
+        self.search_index.update_status(bond_index, old_state.status, state.status)
+        bond = self.chain[bond_index]
+        self.analytics.update_status(bond, old_state.status, state.status, self.ownership.owner_of(bond_index))
+        self.timeline.update_status(bond, old_state.status, state.status)
+    
+    def _apply_status_change(self, block: Block, old_status: str) -> None:
+        """Propagate a block's compliance status change to the indexes."""
+        self.search_index.update_status(block.index, old_status, block.compliance_status)
+        self.analytics.update_status(
+            block, old_status, block.compliance_status, self.ownership.owner_of(block.index)
+        )
+        self.timeline.update_status(block, old_status, block.compliance_status)
+    
+    def _append_block(self, block: Block) -> None:
+        """Persist a new block (if a store is configured) and append it to the chain."""
+        if self.store is not None:
+            self.store.commit({"type": "block", "block": block.to_record()})
+        self._apply_block(block)
+        self._maybe_snapshot()
+    
+    def _maybe_snapshot(self) -> None:
+        """
+        Start a snapshot of the chain once enough records were logged.
+        
+        Only a copy of the committed rows is taken here, on the writer; they
+        are encoded and written by the store's snapshot thread, so writes
+        carry on meanwhile.
+        """
+        if self.store is not None and self.store.snapshot_due():
+            rows = self.chain.committed_slice(0, len(self.chain))
+            self.store.start_snapshot(
+                ({"type": "block", "block": rows.get_committed_row(row)} for row in range(len(rows))),
+                self.store.position()
+            )
+    
+    def close(self) -> None:
+        """Finish the queued writes, then flush and close the ledger store, if any."""
+        with self._writer_lock:
+            self._closed = True
+            writer = self._writer
+            if writer is not None:
+                self._writes.put(None)
+        if writer is not None:
+            writer.join()
+        if self.store is not None:
+            self.store.close()
+    
+    def _submit(self, build: Callable[[_WriteTail], Any]) -> Any:
+        """
+        Queue a write for the writer thread and wait until it is durable and visible.
+        
+        Args:
+            build: Called on the writer thread with the chain tip; appends the
+                write's blocks to it and returns the write's result. If it
+                raises, none of its blocks are added and the exception is
+                re-raised here.
+        """
+        return self._enqueue(build).result()
+    
+    def _enqueue(self, build: Callable[[_WriteTail], Any]) -> Future:
+        """Queue a write for the writer thread without waiting for it."""
+        future: Future = Future()
+        with self._writer_lock:
+            if self._closed:
+                raise RuntimeError("Blockchain is closed")
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="ledger-writer", daemon=True)
+                self._writer.start()
+            self._writes.put((build, future))
+        return future
+    
+    def _on_ledger_change(self) -> None:
+        """Notifier listener: queue a catch-up with other processes' writes unless one is queued."""
+        with self._writer_lock:
+            if self._refresh_queued or self._closed:
+                return
+            self._refresh_queued = True
+        
+        def catch_up(tail: _WriteTail) -> None:
+            self._refresh_queued = False
+        
+        self._enqueue(catch_up)
+    
+    def _write_loop(self) -> None:
+        """Writer thread: apply queued writes in groups until the chain is closed."""
+        while True:
+            requests = [self._writes.get()]
+            while requests[-1] is not None and len(requests) < config.LEDGER_WRITE_GROUP_MAX:
+                try:
+                    requests.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            
+            self._write_group([request for request in requests if request is not None])
+            if requests[-1] is None:
+                return
+    
+    def _write_group(self, requests: List[Tuple[Callable[[_WriteTail], Any], Future]]) -> None:
+        """
+        Build the blocks of a group of writes, log them as one record and then publish them.
+        
+        Readers see none of the group's blocks until the record is durable,
+        and every write in the group shares its fsync. The group is built
+        under the store's inter-process lock, after reading the blocks other
+        processes appended, so block indexes are unique across processes.
+        """
+        accepted = []
+        try:
+            with self._exclusive():
+                if self.store is not None:
+                    for record in self.store.read_new():
+                        self._replay_record(record)
+                
+                tail = _WriteTail(self.chain, self.ownership)
+                for build, future in requests:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    checkpoint = tail.checkpoint()
+                    try:
+                        accepted.append((future, build(tail)))
+                    except Exception as e:
+                        tail.rollback(checkpoint)
+                        future.set_exception(e)
+                
+                if self.store is not None and tail.blocks:
+                    if len(tail.blocks) == 1:
+                        self.store.commit({"type": "block", "block": tail.blocks[0].to_record()})
+                    else:
+                        self.store.commit({"type": "batch", "blocks": [block.to_record() for block in tail.blocks]})
+                for block in tail.blocks:
+                    self._apply_block(block)
+                self._maybe_snapshot()
+            
+            if self.notifier is not None and tail.blocks:
+                self.notifier.bump("ledger")
+        except Exception as e:
+            for future, _ in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for future, result in accepted:
+            future.set_result(result)
     
     def get_latest_block(self) -> Block:
         """Return the latest block in the chain."""
@@ -185,32 +604,166 @@ class Blockchain:
             The newly created block
         
         Raises:
-            ValueError: If user validation fails
+            ValueError: If user validation fails, or the contract purchases a
+                bond that is not available
+        """
+        # Validate users exist in database (through the shared user cache)
+        self._validate_contract(
+            issuer_id,
+            buyer_id,
+            compliance_status,
+            metadata,
+            lambda user_id: user_cache.get_by_id(db, user_id) is not None
+        )
+        
+        def build(tail: _WriteTail) -> Block:
+            self._check_purchase(tail, buyer_id, metadata)
+            new_block = self._new_contract_block(
+                tail.latest,
+                issuer_id=issuer_id,
+                buyer_id=buyer_id,
+                comment=comment,
+                bond_amount=bond_amount,
+                maturity_date=maturity_date,
+                yield_rate=yield_rate,
+                compliance_status=compliance_status,
+                metadata=metadata
+            )
+            tail.append_contract(new_block)
+            return new_block
+        
+        return self._submit(build)
+    
+    def add_blocks(self, contracts: List[Dict[str, Any]], db: Session) -> List[Block]:
+        """
+        Add many contracts at once, all or nothing.
+        
+        Every issuer and buyer referenced by the batch that is not in the user
+        cache is looked up with a single IN query. If any item is invalid nothing is added; otherwise
+        all blocks are appended in one pass by the writer and logged in a
+        single ledger record, so a crash cannot persist part of a batch.
+        
+        Args:
+            contracts: Keyword arguments of `add_block` (except `db`) for each contract
+            db: Database session for user validation
+            
+        Returns:
+            The newly created blocks, in the order of `contracts`
+            
+        Raises:
+            BatchValidationError: If any item is invalid, listing each failure
+                by its position in `contracts`
         """
-        # Validate users exist in database
-        issuer = db.query(User).filter(User.id == issuer_id).first()
+        user_ids = {contract["issuer_id"] for contract in contracts}
+        user_ids.update(contract["buyer_id"] for contract in contracts)
+        existing_ids = {
+            user_id for user_id, user in user_cache.get_many(db, user_ids).items() if user is not None
+        }
         
-        if not issuer:
+        errors = []
+        for position, contract in enumerate(contracts):
+            try:
+                self._validate_contract(
+                    contract["issuer_id"],
+                    contract["buyer_id"],
+                    contract.get("compliance_status", ComplianceStatus.PENDING),
+                    contract.get("metadata"),
+                    existing_ids.__contains__
+                )
+            except ValueError as e:
+                errors.append({"item": position, "error": str(e)})
+        if errors:
+            raise BatchValidationError(errors)
+        
+        def build(tail: _WriteTail) -> List[Block]:
+            errors = []
+            blocks = []
+            for position, contract in enumerate(contracts):
+                try:
+                    self._check_purchase(tail, contract["buyer_id"], contract.get("metadata"))
+                except ValueError as e:
+                    errors.append({"item": position, "error": str(e)})
+                    continue
+                blocks.append(self._new_contract_block(tail.latest, **contract))
+                tail.append_contract(blocks[-1])
+            if errors:
+                raise BatchValidationError(errors)
+            return blocks
+        
+        return self._submit(build)
+    
+    def _validate_contract(
+        self,
+        issuer_id: int,
+        buyer_id: int,
+        compliance_status: str,
+        metadata: Optional[Dict[str, Any]],
+        user_exists: Callable[[int], bool]
+    ) -> None:
+        """
+        Check a new contract's parties, initial status and metadata.
+        
+        Raises:
+            ValueError: If the contract is invalid
+        """
+        if not user_exists(issuer_id):
             raise ValueError(f"Issuer with ID {issuer_id} does not exist")
             
         # For buyer, if ID is 0, it's a special case for a newly issued bond without a buyer yet
         if str(buyer_id) == "0" or buyer_id == 0:
             # This is valid - it's a bond that's available for purchase
             pass
-        else:
-            buyer = db.query(User).filter(User.id == buyer_id).first()
-            if not buyer:
-                raise ValueError(f"Buyer with ID {buyer_id} does not exist")
+        elif not user_exists(buyer_id):
+            raise ValueError(f"Buyer with ID {buyer_id} does not exist")
         
         # Validate compliance status
         if compliance_status not in [ComplianceStatus.PENDING, ComplianceStatus.COMPLIANT,
                                    ComplianceStatus.NON_COMPLIANT, ComplianceStatus.UNDER_REVIEW]:
             raise ValueError(f"Invalid compliance status: {compliance_status}")
         
-        latest_block = self.get_latest_block()
-        new_block = Block(
+        if metadata and "event" in metadata:
+            raise ValueError("Metadata key 'event' is reserved for ledger events")
+    
+    def _check_purchase(self, tail: _WriteTail, buyer_id: int, metadata: Optional[Dict[str, Any]]) -> None:
+        """
+        Check that a contract purchasing a bond names a bond that is still available.
+        
+        Runs on the writer thread, so of two purchases of the same bond the
+        second always sees the first, even within one group of writes.
+        
+        Raises:
+            ValueError: If the bond does not exist, was already purchased, or
+                the purchase has no buyer
+        """
+        bond_index = (metadata or {}).get(ORIGINAL_BOND_KEY)
+        if bond_index is None:
+            return
+        
+        owner = tail.owner_of(bond_index)
+        if owner is None:
+            raise ValueError(f"Bond {bond_index} does not exist or cannot be purchased")
+        if owner != 0:
+            raise ValueError(f"Bond {bond_index} was already purchased")
+        if buyer_id == 0:
+            raise ValueError("A purchase must name its buyer")
+    
+    def _new_contract_block(
+        self,
+        latest_block: Block,
+        issuer_id: int,
+        buyer_id: int,
+        comment: str,
+        bond_amount: float = 0.0,
+        maturity_date: Optional[str] = None,
+        yield_rate: Optional[float] = None,
+        compliance_status: str = ComplianceStatus.PENDING,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Block:
+        """Build the block of a validated contract, following `latest_block`."""
+        now = time.time()
+        return Block(
             index=latest_block.index + 1,
-            timestamp=time.time(),
+            timestamp=now,
             issuer_id=issuer_id,
             buyer_id=buyer_id,
             comment=comment,
@@ -221,33 +774,100 @@ class Blockchain:
             compliance_history=[{
                 "previous_status": None,
                 "new_status": compliance_status,
-                "timestamp": time.time(),
+                "timestamp": now,
                 "reason": "Initial status",
                 "updated_by": issuer_id
             }],
             metadata=metadata or {},
             previous_hash=latest_block.hash
         )
+    
+    def mark_dirty(self, index: int) -> None:
+        """Flag a block as modified so the next validation re-checks it."""
+        if index <= self._verified_upto:
+            self._dirty.add(index)
+    
+    def _is_block_valid(self, index: int, deep: bool = False) -> bool:
+        """Verify a single block's hash and its link to the previous block."""
+        current_block = self.chain[index]
+        previous_block = self.chain[index - 1]
+        
+        # Verify current block's hash
+        if current_block.hash != current_block.calculate_hash(deep=deep):
+            return False
         
-        self.chain.append(new_block)
-        return new_block
+        # Verify previous hash reference
+        if current_block.previous_hash != previous_block.hash:
+            return False
+        
+        return True
     
-    def is_chain_valid(self) -> bool:
-        """Validate the integrity of the blockchain."""
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i-1]
+    def is_chain_valid(self, full: bool = False) -> bool:
+        """
+        Validate the integrity of the blockchain.
+        
+        By default only the blocks that changed since the last successful
+        validation are checked: dirty blocks below the verified watermark
+        (together with the link from their successor) and every block appended
+        after it.
+        
+        Args:
+            full: Re-hash every block in the chain instead of relying on the
+                verified watermark (full audit)
             
-            # Verify current block's hash
-            if current_block.hash != current_block.calculate_hash():
-                return False
+        Returns:
+            True if the chain is valid, False otherwise
+        """
+        with self._validation_lock:
+            # Blocks appended while validating are left for the next validation
+            end = len(self.chain)
+            if full:
+                return self._validate_full(end)
+            
+            for index in sorted(self._dirty):
+                if index > 0 and not self._is_block_valid(index):
+                    return False
+                
+                # The successor's previous_hash must still match the dirty block
+                if index + 1 <= self._verified_upto:
+                    if self.chain[index + 1].previous_hash != self.chain[index].hash:
+                        return False
+            
+            for index in range(self._verified_upto + 1, end):
+                if not self._is_block_valid(index):
+                    return False
             
-            # Verify previous hash reference
-            if current_block.previous_hash != previous_block.hash:
+            self._verified_upto = end - 1
+            self._dirty.clear()
+            return True
+    
+    def _validate_full(self, end: int) -> bool:
+        """Re-hash the chain up to `end` and reset the watermark to the result."""
+        for index in range(1, end):
+            if not self._is_block_valid(index, deep=True):
+                # Everything before the first bad block is known to be good
+                self._verified_upto = min(self._verified_upto, index - 1)
+                self._dirty = {i for i in self._dirty if i >= index}
                 return False
         
+        self._verified_upto = end - 1
+        self._dirty.clear()
         return True
     
+    def record_audit(self, first_bad_index: Optional[int]) -> None:
+        """
+        Apply the outcome of a background full audit to the validation watermark.
+        
+        A failed audit lowers the watermark to just before the first bad
+        block, as a synchronous full audit does, so incremental validations
+        fail until the block is fixed. A passed audit changes nothing, as
+        blocks may have been modified since the audit read them.
+        """
+        if first_bad_index is None:
+            return
+        with self._validation_lock:
+            self._verified_upto = min(self._verified_upto, first_bad_index - 1)
+    
     def update_compliance_status(
         self,
         block_index: int,
@@ -256,27 +876,69 @@ class Blockchain:
         updated_by: int
     ) -> Block:
         """
-        Update the compliance status of a specific block in the chain.
+        Update the compliance status of a specific contract.
+        
+        The change is appended to the chain as a compliance event block that
+        references the contract and commits the new Merkle root of its history;
+        the contract's own block is never modified. Its current status and
+        history are then updated in the compliance view.
         
         Args:
-            block_index: Index of the block to update
+            block_index: Index of the contract to update
             new_status: New compliance status
             reason: Reason for the status change
             updated_by: ID of the user who updated the status
             
         Returns:
-            The updated block
+            The updated contract block
             
         Raises:
             ValueError: If the block index is invalid or the status is invalid
         """
-        if block_index <= 0 or block_index >= len(self.chain):
-            raise ValueError(f"Invalid block index: {block_index}")
+        if new_status not in [ComplianceStatus.PENDING, ComplianceStatus.COMPLIANT,
+                             ComplianceStatus.NON_COMPLIANT, ComplianceStatus.UNDER_REVIEW]:
+            raise ValueError(f"Invalid compliance status: {new_status}")
         
-        block = self.chain[block_index]
-        block.update_compliance_status(new_status, reason, updated_by)
+        def build(tail: _WriteTail) -> Block:
+            # Checked by the writer, which has read contracts added by other processes
+            if block_index <= 0 or block_index >= len(self.chain):
+                raise ValueError(f"Invalid block index: {block_index}")
+            if not self.search_index.is_contract(block_index):
+                raise ValueError(f"Block {block_index} is a compliance event, not a contract")
+            
+            block = self.chain[block_index]
+            now = time.time()
+            state = tail.compliance_state(block_index)
+            entry = {
+                "previous_status": state.status,
+                "new_status": new_status,
+                "timestamp": now,
+                "reason": reason,
+                "updated_by": updated_by
+            }
+            
+            event_index = tail.latest.index + 1
+            tail.states[block_index] = state = state.after(entry, event_index)
+            tail.append(Block(
+                index=event_index,
+                timestamp=now,
+                issuer_id=block.issuer_id,
+                buyer_id=block.buyer_id,
+                comment=reason,
+                compliance_status=new_status,
+                compliance_history=[entry],
+                metadata={
+                    "event": COMPLIANCE_EVENT,
+                    "bond_index": block_index,
+                    "history_root": state.history_root.hex()
+                },
+                previous_hash=tail.latest.hash
+            ))
+            return block
         
-        # Verify chain integrity
+        block = self._submit(build)
+        
+        # Only the appended events need verifying
         if not self.is_chain_valid():
             raise ValueError("Updating compliance status compromised chain integrity")
         
@@ -288,13 +950,55 @@ class Blockchain:
             return self.chain[index]
         return None
     
+    def find_blocks(
+        self,
+        issuer_id: Optional[int] = None,
+        buyer_id: Optional[int] = None,
+        compliance_status: Optional[str] = None,
+        maturity_date_start: Optional[str] = None,
+        maturity_date_end: Optional[str] = None,
+        q: Optional[str] = None
+    ) -> List[Block]:
+        """
+        Find the blocks matching the specified criteria, using the search index.
+        
+        Args:
+            issuer_id: Filter by issuer ID
+            buyer_id: Filter by buyer ID
+            compliance_status: Filter by compliance status
+            maturity_date_start: Filter by maturity date range (start)
+            maturity_date_end: Filter by maturity date range (end)
+            q: Words that must all start a word of the comment or of a
+                metadata value (case-insensitive)
+            
+        Returns:
+            List of matching blocks in chain order, or by decreasing relevance
+            to `q` when it is given
+        """
+        scores = self.text_index.search(q) if q else None
+        indexes = self.search_index.search(
+            self.chain,
+            issuer_id=issuer_id,
+            buyer_id=buyer_id,
+            compliance_status=compliance_status,
+            maturity_date_start=maturity_date_start,
+            maturity_date_end=maturity_date_end,
+            within=scores
+        )
+        if scores is not None:
+            # Stable sort: equally relevant blocks stay in chain order
+            indexes.sort(key=lambda index: -scores[index])
+        
+        return [self.chain[index] for index in indexes]
+    
     def search_blocks(
         self,
         issuer_id: Optional[int] = None,
         buyer_id: Optional[int] = None,
         compliance_status: Optional[str] = None,
         maturity_date_start: Optional[str] = None,
-        maturity_date_end: Optional[str] = None
+        maturity_date_end: Optional[str] = None,
+        q: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for blocks matching the specified criteria.
@@ -305,38 +1009,28 @@ class Blockchain:
             compliance_status: Filter by compliance status
             maturity_date_start: Filter by maturity date range (start)
             maturity_date_end: Filter by maturity date range (end)
+            q: Full-text query over comments and metadata values
             
         Returns:
             List of matching blocks as dictionaries
         """
-        results = []
+        blocks = self.find_blocks(
+            issuer_id=issuer_id,
+            buyer_id=buyer_id,
+            compliance_status=compliance_status,
+            maturity_date_start=maturity_date_start,
+            maturity_date_end=maturity_date_end,
+            q=q
+        )
         
-        for block in self.chain[1:]:  # Skip genesis block
-            if issuer_id is not None and block.issuer_id != issuer_id:
-                continue
-                
-            if buyer_id is not None and block.buyer_id != buyer_id:
-                continue
-                
-            if compliance_status is not None and block.compliance_status != compliance_status:
-                continue
-                
-            if maturity_date_start is not None and block.maturity_date < maturity_date_start:
-                continue
-                
-            if maturity_date_end is not None and block.maturity_date > maturity_date_end:
-                continue
-                
-            results.append(block.to_dict())
-            
-        return results
+        return [block.to_dict() for block in blocks]
     
     def get_compliance_history(self, block_index: int) -> List[Dict[str, Any]]:
         """
-        Get the compliance history of a specific block.
+        Get the compliance history of a specific contract from the compliance view.
         
         Args:
-            block_index: Index of the block
+            block_index: Index of the contract
             
         Returns:
             List of compliance history entries
@@ -346,6 +1040,8 @@ class Blockchain:
         """
         if block_index <= 0 or block_index >= len(self.chain):
             raise ValueError(f"Invalid block index: {block_index}")
+        if not self.search_index.is_contract(block_index):
+            raise ValueError(f"Block {block_index} is a compliance event, not a contract")
             
         block = self.chain[block_index]
         history = block.compliance_history
@@ -355,10 +1051,122 @@ class Blockchain:
             "timestamp": timestamp_to_string(entry["timestamp"])
         } for entry in history]
     
+    def get_blocks_page(
+        self,
+        cursor: Optional[int] = None,
+        limit: Optional[int] = None,
+        descending: bool = False
+    ) -> Tuple[List[Block], Optional[int]]:
+        """
+        Return a window of contract blocks keyed by block index.
+        
+        The genesis block and compliance events are skipped, so consecutive
+        contracts on a page need not have consecutive indexes.
+        
+        Args:
+            cursor: Index of the last block already received; the page starts
+                right after it (or right before it when descending)
+            limit: Maximum number of blocks to return (None for all remaining)
+            descending: Walk the chain from newest to oldest
+            
+        Returns:
+            Tuple of (blocks, cursor for the next page or None)
+        """
+        contracts = self.search_index.contracts
+        
+        if descending:
+            stop = len(contracts) if cursor is None else bisect_left(contracts, cursor)
+            start = 0 if limit is None else max(0, stop - limit)
+            indexes = contracts[start:stop][::-1]
+            has_more = start > 0
+        else:
+            start = 0 if cursor is None else bisect_right(contracts, cursor)
+            stop = len(contracts) if limit is None else min(len(contracts), start + limit)
+            indexes = contracts[start:stop]
+            has_more = stop < len(contracts)
+        
+        blocks = [self.chain[index] for index in indexes]
+        next_cursor = indexes[-1] if blocks and has_more else None
+        return blocks, next_cursor
+    
+    def iter_blocks(self, start: int = 0) -> Iterator[Block]:
+        """
+        Lazily yield blocks from `start` up to the chain tip at call time.
+        
+        Blocks appended while iterating are not included, so a consumer can
+        resume from the last index it received.
+        """
+        end = len(self.chain)
+        for index in range(max(start, 0), end):
+            yield self.chain[index]
+    
+    def get_history_proof(self, block_index: int, entry_index: int) -> Dict[str, Any]:
+        """
+        Build a Merkle inclusion proof for one compliance history entry.
+        
+        The proof is an RFC 6962 audit path from the entry's leaf hash to the
+        current history root. That root is committed by the anchor block: the
+        latest compliance event of the contract, or the contract block itself
+        when it has none.
+        
+        Args:
+            block_index: Index of the contract
+            entry_index: Position of the entry in the contract's compliance history
+            
+        Returns:
+            Dictionary with the entry, its leaf hash, the audit path, the history
+            root and the index and hash of the anchor block
+            
+        Raises:
+            ValueError: If either index is invalid or the block predates Merkle commitments
+        """
+        if block_index <= 0 or block_index >= len(self.chain):
+            raise ValueError(f"Invalid block index: {block_index}")
+        if not self.search_index.is_contract(block_index):
+            raise ValueError(f"Block {block_index} is a compliance event, not a contract")
+        
+        block = self.chain[block_index]
+        if block.hash_version < 2:
+            raise ValueError(f"Block {block_index} does not commit its history as a Merkle root")
+        
+        # History, root and anchor all come from one state, even if an event lands meanwhile
+        state = self.chain.compliance_state(block_index)
+        history = self.chain.history(block_index, state)
+        if entry_index < 0 or entry_index >= len(history):
+            raise ValueError(f"Invalid history entry index: {entry_index}")
+        
+        leaves = [merkle.history_leaf(entry) for entry in history]
+        anchor = self.chain[state.event_index]
+        return {
+            "block_index": block_index,
+            "entry_index": entry_index,
+            "entry": history[entry_index],
+            "leaf_hash": leaves[entry_index].hex(),
+            "tree_size": len(leaves),
+            "proof": [node.hex() for node in merkle.inclusion_proof(leaves, entry_index)],
+            "history_root": state.history_root.hex(),
+            "anchor_index": anchor.index,
+            "anchor_hash": anchor.hash
+        }
+    
     def get_all_blocks(self) -> List[Dict[str, Any]]:
         """Return all blocks in the chain as dictionaries."""
         return [block.to_dict() for block in self.chain]
 
 
+def create_blockchain() -> Blockchain:
+    """Create the blockchain, backed by the durable ledger store unless it is disabled."""
+    if not config.LEDGER_DIR:
+        return Blockchain()
+    
+    store = LedgerStore(
+        config.LEDGER_DIR,
+        segment_bytes=config.LEDGER_SEGMENT_BYTES,
+        group_commit_ms=config.LEDGER_GROUP_COMMIT_MS,
+        snapshot_every=config.LEDGER_SNAPSHOT_EVERY
+    )
+    return Blockchain(store=store, notifier=change_notifier)
+
+
 # Create a singleton instance of the blockchain
-blockchain = Blockchain()
\ No newline at end of file
+blockchain = create_blockchain()
\ No newline at end of file
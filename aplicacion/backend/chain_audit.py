@@ -0,0 +1,232 @@
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from block_hash import hash_block_fields
+from block_store import BlockStore
+from config import config
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Finished jobs kept in memory (and status files on disk) per auditor
+MAX_KEPT_JOBS = 20
+
+
+# Module-level so it can be sent to worker processes
+
+def _first_bad_row(part: BlockStore) -> Optional[int]:
+    """
+    Re-hash the rows of a committed slice and check the links between them.
+
+    Returns:
+        The first row whose hash does not match its fields or whose
+        previous_hash is not the hash of the row before it (the link of row
+        0 is left to the caller), or None if every row is valid
+    """
+    previous_hash = None
+    for row in range(len(part)):
+        fields = part.get_committed_row(row)
+        if fields["hash"] != hash_block_fields(fields):
+            return row
+        if row > 0 and fields["previous_hash"] != previous_hash:
+            return row
+        previous_hash = fields["hash"]
+    return None
+
+
+class AuditJob:
+    """Progress and outcome of one background full-chain audit."""
+
+    def __init__(self, blocks: int, workers: int):
+        self.id = uuid.uuid4().hex
+        self.status = "running"
+        self.blocks = blocks
+        self.checked = 0
+        self.first_bad_index: Optional[int] = None
+        self.error: Optional[str] = None
+        self.workers = workers
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the job as the JSON body of the audit endpoints."""
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "id": self.id,
+            "status": self.status,
+            "blocks": self.blocks,
+            "checked": self.checked,
+            "progress": self.checked / self.blocks if self.blocks else 1.0,
+            "first_bad_index": self.first_bad_index,
+            "error": self.error,
+            "workers": self.workers,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "blocks_per_second": self.checked / elapsed if elapsed > 0 else None
+        }
+
+
+class ChainAuditor:
+    """
+    Runs full-chain audits as background jobs, re-hashing ranges of blocks on a process pool.
+
+    The chain is split into ranges of `chunk_blocks` blocks. Each range is
+    copied out of the block store and re-hashed by a worker, which also
+    checks the previous_hash links inside it; the links at range boundaries
+    are checked as results come back, in chain order, so the first bad
+    block found is the first bad block of the chain. Only a few ranges per
+    worker are in flight at once, bounding memory however long the chain.
+
+    A job audits the blocks present when it starts and runs on its own
+    thread, so requests are served meanwhile; one job runs at a time per
+    process. With a `status_dir`, progress is also written there so any
+    worker process of the server can report on a job.
+    """
+
+    def __init__(self, workers: int = 1, chunk_blocks: int = 4096, status_dir: Optional[str] = None):
+        """
+        Args:
+            workers: Number of worker processes (0 to hash on a thread instead)
+            chunk_blocks: Blocks re-hashed per task
+            status_dir: Directory where job status files are written (None to keep them in memory only)
+        """
+        self.workers = workers
+        self.chunk_blocks = chunk_blocks
+        self.status_dir = status_dir
+        self.jobs: Dict[str, AuditJob] = {}
+        self._running: Optional[AuditJob] = None
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # Spawned workers do not inherit the server's threads and open files
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chain-audit")
+            return self._executor
+
+    def start(self, blockchain) -> AuditJob:
+        """Start auditing a chain in the background, or return the audit already running."""
+        with self._lock:
+            if self._running is not None:
+                return self._running
+            job = self._running = AuditJob(len(blockchain.chain) - 1, self.workers)
+            self.jobs[job.id] = job
+            for old_id in list(self.jobs)[:-MAX_KEPT_JOBS]:
+                del self.jobs[old_id]
+
+        self._publish(job)
+        threading.Thread(target=self._run, args=(job, blockchain), name="chain-audit", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the status of a job started by any process sharing the status directory."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.status_dir is None or not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.status_dir, f"{job_id}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _run(self, job: AuditJob, blockchain) -> None:
+        try:
+            job.first_bad_index = self._audit(job, blockchain.chain, job.blocks + 1)
+            job.status = "passed" if job.first_bad_index is None else "failed"
+            blockchain.record_audit(job.first_bad_index)
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            # A worker that died leaves the pool broken; the next job starts a new one
+            self.close()
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._running = None
+            self._publish(job)
+            self._prune_status_files()
+
+    def _audit(self, job: AuditJob, chain: BlockStore, end: int) -> Optional[int]:
+        """Re-hash blocks [1, end) and return the index of the first bad one (None if all are valid)."""
+        executor = self._get_executor()
+        ranges = iter(range(1, end, self.chunk_blocks))
+        in_flight: deque = deque()
+
+        def submit_next() -> None:
+            start = next(ranges, None)
+            if start is not None:
+                stop = min(start + self.chunk_blocks, end)
+                in_flight.append((start, stop, executor.submit(_first_bad_row, chain.committed_slice(start, stop))))
+
+        for _ in range(max(2 * self.workers, 2)):
+            submit_next()
+
+        while in_flight:
+            start, stop, future = in_flight.popleft()
+            bad_row = future.result()
+            if chain[start].previous_hash != chain[start - 1].hash:
+                bad_row = 0
+            if bad_row is not None:
+                for _, _, pending in in_flight:
+                    pending.cancel()
+                return start + bad_row
+
+            job.checked += stop - start
+            self._publish(job)
+            submit_next()
+        return None
+
+    def _publish(self, job: AuditJob) -> None:
+        """Write a job's status where the other worker processes can read it."""
+        if self.status_dir is None:
+            return
+        os.makedirs(self.status_dir, exist_ok=True)
+        path = os.path.join(self.status_dir, f"{job.id}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(path + ".tmp", path)
+
+    def _prune_status_files(self) -> None:
+        """Remove all but the newest MAX_KEPT_JOBS status files."""
+        if self.status_dir is None:
+            return
+        paths = [
+            os.path.join(self.status_dir, name) for name in os.listdir(self.status_dir)
+            if name.endswith(".json")
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-MAX_KEPT_JOBS]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        """Shut the worker pool down."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+chain_auditor = ChainAuditor(
+    workers=config.AUDIT_WORKERS,
+    chunk_blocks=config.AUDIT_CHUNK_BLOCKS,
+    status_dir=os.path.join(config.LEDGER_DIR, "audits") if config.LEDGER_DIR else None
+)
@@ -0,0 +1,129 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from config import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so a single worker only
+    fcntl = None
+
+COUNTER = struct.Struct("<Q")
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeNotifier:
+    """
+    Change counters shared by the worker processes of one host.
+
+    Each channel is an 8-byte counter in a small memory-mapped file. A process
+    that changes shared state (the ledger, the users table) bumps the
+    channel's counter; every process polls the counters from a background
+    thread and calls the channel's listeners when one moved. Polling is a
+    memory read, so peers notice a change within `poll_ms` at no cost per
+    change. Listeners are also called for the process's own bumps, so they
+    must be cheap when there is nothing new.
+    """
+
+    def __init__(self, path: str, channels: Sequence[str], poll_ms: float = 50.0):
+        """
+        Open (or create) the shared counters file.
+
+        Args:
+            path: Counters file, shared by every worker
+            channels: Channel names; every process must list them in the same order
+            poll_ms: How often the counters are checked for changes
+        """
+        self.channels = list(channels)
+        self.poll_interval = poll_ms / 1000
+
+        size = COUNTER.size * len(self.channels)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._file_lock():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+        self._lock = threading.Lock()
+        self._listeners: Dict[str, List[Callable[[], None]]] = {}
+        self._seen: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the counters file's inter-process lock."""
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _slot(self, channel: str) -> int:
+        return self.channels.index(channel) * COUNTER.size
+
+    def version(self, channel: str) -> int:
+        """Return the current value of a channel's counter."""
+        return COUNTER.unpack_from(self._map, self._slot(channel))[0]
+
+    def bump(self, channel: str) -> None:
+        """Tell every process that the state behind `channel` changed."""
+        slot = self._slot(channel)
+        with self._lock, self._file_lock():
+            COUNTER.pack_into(self._map, slot, COUNTER.unpack_from(self._map, slot)[0] + 1)
+
+    def subscribe(self, channel: str, listener: Callable[[], None]) -> None:
+        """Call `listener` (on the polling thread) whenever `channel` is bumped."""
+        with self._lock:
+            self._seen.setdefault(channel, self.version(channel))
+            self._listeners.setdefault(channel, []).append(listener)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, name="change-notifier", daemon=True)
+                self._poller.start()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                changed = []
+                for channel, listeners in self._listeners.items():
+                    version = self.version(channel)
+                    if version != self._seen[channel]:
+                        self._seen[channel] = version
+                        changed.extend(listeners)
+
+            for listener in changed:
+                try:
+                    listener()
+                except Exception:
+                    logger.exception("Change listener failed")
+
+    def close(self) -> None:
+        """Stop polling and release the counters file."""
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+        self._map.close()
+        os.close(self._fd)
+
+
+def create_change_notifier() -> Optional[ChangeNotifier]:
+    """Create the notifier shared by the workers, next to the ledger (None without a ledger directory)."""
+    if not config.LEDGER_DIR:
+        return None
+    os.makedirs(config.LEDGER_DIR, exist_ok=True)
+    return ChangeNotifier(
+        os.path.join(config.LEDGER_DIR, "changes"),
+        channels=("ledger", "users"),
+        poll_ms=config.CHANGE_POLL_MS
+    )
+
+
+change_notifier = create_change_notifier()
@@ -7,9 +7,55 @@ class Config:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your_secret_key")  # Should be overridden in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
     
     # Database Configuration
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+    # Async endpoints use DATABASE_URL through its async driver unless this is set
+    ASYNC_DATABASE_URL: Optional[str] = os.getenv("ASYNC_DATABASE_URL", None)
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # PostgreSQL connection pool (per engine and worker process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    
+    # Ledger persistence (an empty LEDGER_DIR keeps the chain in memory only)
+    LEDGER_DIR: str = os.getenv("LEDGER_DIR", "./ledger")
+    LEDGER_SEGMENT_BYTES: int = int(os.getenv("LEDGER_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+    LEDGER_GROUP_COMMIT_MS: float = float(os.getenv("LEDGER_GROUP_COMMIT_MS", "2"))
+    LEDGER_SNAPSHOT_EVERY: int = int(os.getenv("LEDGER_SNAPSHOT_EVERY", "100000"))
+    # Most queued writes the ledger writer appends and logs as one group
+    LEDGER_WRITE_GROUP_MAX: int = int(os.getenv("LEDGER_WRITE_GROUP_MAX", "256"))
+    
+    # Blocks whose JSON encoding is kept for the list endpoints (least recently used go first)
+    BLOCK_JSON_CACHE_SIZE: int = int(os.getenv("BLOCK_JSON_CACHE_SIZE", "50000"))
+    
+    # How often each worker checks whether other workers changed the ledger or users
+    CHANGE_POLL_MS: float = float(os.getenv("CHANGE_POLL_MS", "50"))
+    
+    # Background full-chain audits: worker processes (0 hashes on a thread in the
+    # serving process) and blocks re-hashed per task
+    AUDIT_WORKERS: int = int(os.getenv("AUDIT_WORKERS", str(os.cpu_count() or 1)))
+    AUDIT_CHUNK_BLOCKS: int = int(os.getenv("AUDIT_CHUNK_BLOCKS", "4096"))
+    
+    # Maximum number of contracts accepted by one /contracts/batch request
+    CONTRACT_BATCH_MAX_ITEMS: int = int(os.getenv("CONTRACT_BATCH_MAX_ITEMS", "10000"))
+    
+    # User lookup cache shared by the API and the blockchain
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+    
+    # Password hashing (bcrypt runs on a pool of worker processes)
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+    PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+    
+    # Verified JWT claims cached per token until the token expires
+    CLAIMS_CACHE_SIZE: int = int(os.getenv("CLAIMS_CACHE_SIZE", "10000"))
     
     # CORS Configuration
     FRONTEND_URL: Optional[str] = os.getenv("FRONTEND_URL", None)
@@ -1,4 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String
+import threading
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import config
@@ -6,15 +11,195 @@ from config import config
 # Get database URL from config
 SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
 
-# Create engine with SQLite-specific args if using SQLite
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# Drivers used by the async engine for each backend
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+# Requirements file installing the drivers of backends other than SQLite
+BACKEND_REQUIREMENTS = {
+    "postgresql": "requirements-postgresql.txt",
+}
+
+
+class MissingDriverError(RuntimeError):
+    """Raised when the DBAPI driver of a database URL is not installed."""
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Return the PRAGMAs applied to every new SQLite connection."""
+    return {
+        # Readers no longer block the writer (and vice versa); needs a file database
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        # NORMAL only syncs at checkpoints in WAL mode, which is still crash safe
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        # Wait for a competing writer instead of failing with "database is locked"
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+    }
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    Return the engine keyword arguments of the profile for a database URL.
+
+    SQLite connections are shared across threads and wait out competing
+    writers; PostgreSQL gets a sized pool whose connections are checked
+    before use and recycled before the server drops them.
+    """
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000
+            }
+        }
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+    if backend == "postgresql":
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=config.DB_POOL_RECYCLE_SECONDS
+        )
+    return options
+
+
+def async_url(url: str) -> str:
+    """Return the URL of the same database through its async driver."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    """
+    Connection usage counters of an engine's pool, fed by pool events.
+
+    Besides the totals, `checked_out` and `peak_checked_out` show how close
+    the pool came to its size; a peak at `size + max_overflow` means
+    requests were waiting for a connection.
+    """
+
+    def __init__(self, engine: Engine):
+        self.pool = engine.pool
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.checked_out -= 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the pool's configuration and usage since startup."""
+        with self._lock:
+            stats: Dict[str, Any] = {
+                "pool": type(self.pool).__name__,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out
+            }
+        # Only queue pools have a fixed size and overflow
+        if hasattr(self.pool, "size"):
+            stats["size"] = self.pool.size()
+            stats["overflow"] = self.pool.overflow()
+        return stats
+
+
+def _apply_sqlite_pragmas(engine: Engine, pragmas: Dict[str, Any]) -> None:
+    """Run the PRAGMAs on every connection the engine opens."""
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _missing_driver(url: str, error: ModuleNotFoundError) -> MissingDriverError:
+    """Describe which driver a URL needs and how to install it."""
+    backend = make_url(url).get_backend_name()
+    requirements = BACKEND_REQUIREMENTS.get(backend)
+    install = f"pip install -r {requirements}" if requirements else f"pip install {error.name}"
+    return MissingDriverError(
+        f"The {backend} database driver '{error.name}' is not installed; run `{install}`"
     )
-else:
-    # For PostgreSQL or other databases
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
+
+def create_db_engine(url: str, pragmas: Optional[Dict[str, Any]] = None) -> Engine:
+    """
+    Create a synchronous engine using the profile of the URL's backend.
+
+    Args:
+        url: Database URL
+        pragmas: SQLite PRAGMAs to use instead of the configured ones
+
+    Raises:
+        MissingDriverError: If the backend's driver is not installed
+    """
+    try:
+        engine = create_engine(url, **engine_options(url))
+    except ModuleNotFoundError as e:
+        raise _missing_driver(url, e) from e
+    if engine.dialect.name == "sqlite":
+        _apply_sqlite_pragmas(engine, sqlite_pragmas() if pragmas is None else pragmas)
+    return engine
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    """
+    Create an async engine for a database URL, through its backend's async driver.
+
+    Raises:
+        MissingDriverError: If the backend's async driver is not installed
+    """
+    try:
+        engine = create_async_engine(async_url(url), **engine_options(url))
+    except ModuleNotFoundError as e:
+        raise _missing_driver(url, e) from e
+    # Events are registered on the sync engine the async one wraps
+    if engine.dialect.name == "sqlite":
+        _apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas())
+    return engine
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+pool_metrics = PoolMetrics(engine)
+
+# Used by the async endpoints; objects stay readable after commit, as there is no lazy loading
+async_engine = create_async_db_engine(config.ASYNC_DATABASE_URL or SQLALCHEMY_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+async_pool_metrics = PoolMetrics(async_engine.sync_engine)
 
 Base = declarative_base()
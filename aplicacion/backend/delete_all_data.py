@@ -8,7 +8,9 @@ This script should NEVER be used in a production environment.
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User
-from blockchain import blockchain, Blockchain
+from blockchain import blockchain
+from config import config
+from ledger_store import LedgerStore
 
 def delete_all_data():
     """
@@ -38,10 +40,18 @@ def delete_all_data():
         global blockchain
         block_count = len(blockchain.chain) - 1  # Subtract 1 for genesis block
         
-        # Create a new blockchain instance (which automatically creates a genesis block)
-        blockchain.__init__()
+        # The chain is replayed from the ledger on startup, so its segments
+        # and snapshots are deleted; the next start creates a new genesis block
+        blockchain.close()
+        if config.LEDGER_DIR:
+            store = LedgerStore(config.LEDGER_DIR)
+            try:
+                store.reset()
+            finally:
+                store.close()
         
         print(f"Successfully reset the blockchain, removing {block_count} transaction blocks.")
+        print("Restart the backend servers so they drop the blocks they still hold in memory.")
         
         print("\nDatabase and blockchain have been reset to initial state.")
         
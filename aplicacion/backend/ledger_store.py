@@ -0,0 +1,507 @@
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so a single process only
+    fcntl = None
+
+# Every record is framed as <payload length><crc32 of payload><payload>
+FRAME_HEADER = struct.Struct("<II")
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})\.log$")
+SNAPSHOT_PATTERN = re.compile(r"^snapshot-(\d{8})-(\d{12})\.snap$")
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerCorruptionError(Exception):
+    """Raised when the on-disk ledger fails framing, checksum or hash checks."""
+
+
+class TornFrameError(LedgerCorruptionError):
+    """Raised when a file ends in the middle of a frame, as a crash during a write leaves it."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+def encode_frame(record: Dict[str, Any]) -> bytes:
+    """Serialize a record into a checksummed frame."""
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(path: str, start: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (offset, record) pairs from a memory-mapped segment or snapshot file.
+
+    Args:
+        path: File to read
+        start: Byte offset of the first frame to read
+
+    Raises:
+        TornFrameError: If the file ends in the middle of a frame
+        LedgerCorruptionError: If a frame fails its checksum
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= start:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = start
+            while offset < size:
+                if offset + FRAME_HEADER.size > size:
+                    raise TornFrameError(f"Truncated frame header in {path} at offset {offset}", offset)
+
+                length, crc = FRAME_HEADER.unpack_from(mm, offset)
+                end = offset + FRAME_HEADER.size + length
+                if end > size:
+                    raise TornFrameError(f"Truncated frame in {path} at offset {offset}", offset)
+
+                payload = mm[offset + FRAME_HEADER.size:end]
+                if zlib.crc32(payload) != crc:
+                    raise LedgerCorruptionError(f"Checksum mismatch in {path} at offset {offset}")
+
+                yield offset, json.loads(payload)
+                offset = end
+
+
+class LedgerStore:
+    """
+    Durable append-only log of ledger records.
+
+    Records are appended to numbered segment files and made durable by a
+    background flusher that fsyncs every `group_commit_ms`, so concurrent
+    writers share a single fsync (group commit). Periodic snapshots capture
+    the full ledger state together with the log position they cover, so that
+    startup only has to replay the log written after the latest snapshot.
+    Snapshots are written on a background thread, and segments the previous
+    snapshot already covered are deleted once a new one is in place.
+
+    Several processes on one host may share a directory. Each appends only
+    inside `exclusive()`, after reading what the others appended with
+    `read_new`, so the log stays a single sequence.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        group_commit_ms: float = 2.0,
+        snapshot_every: int = 100_000
+    ):
+        """
+        Open (or create) a ledger store.
+
+        Args:
+            directory: Directory holding the segment and snapshot files
+            segment_bytes: Size after which a new segment file is started
+            group_commit_ms: How long the flusher waits to batch writes into one fsync
+            snapshot_every: Number of appended records between snapshots
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.group_commit_interval = group_commit_ms / 1000
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._file = None
+        self._segment = max(self._segments(), default=1)
+        self._offset = 0
+        self._written_lsn = 0
+        self._durable_lsn = 0
+        self._records_since_snapshot = 0
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        self._snapshotter: Optional[threading.Thread] = None
+
+        # Log position just past the last record this process replayed, read or wrote
+        self._read_segment, self._read_offset = 1, 0
+        self._snapshot_position: Optional[Tuple[int, int]] = None
+        self._lock_fd = os.open(self._path("writer.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, segment: int) -> str:
+        return self._path(f"segment-{segment:08d}.log")
+
+    def _segments(self) -> List[int]:
+        """Return the numbers of all segment files, in order."""
+        return sorted(
+            int(match.group(1))
+            for match in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if match
+        )
+
+    def _latest_snapshot(self) -> Optional[Tuple[str, int, int]]:
+        """Return (path, segment, offset) of the most recent snapshot, if any."""
+        snapshots = sorted(
+            (int(match.group(1)), int(match.group(2)), match.group(0))
+            for match in map(SNAPSHOT_PATTERN.match, os.listdir(self.directory)) if match
+        )
+        if not snapshots:
+            return None
+        segment, offset, name = snapshots[-1]
+        return self._path(name), segment, offset
+
+    def has_data(self) -> bool:
+        """Return True if the store holds any records."""
+        if self._latest_snapshot() is not None:
+            return True
+        return any(os.path.getsize(self._segment_path(s)) > 0 for s in self._segments())
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every record in the ledger, starting from the latest snapshot.
+
+        Raises:
+            LedgerCorruptionError: If the snapshot or any segment is corrupted
+        """
+        start_segment, start_offset = 1, 0
+        snapshot = self._latest_snapshot()
+
+        if snapshot is not None:
+            path, start_segment, start_offset = snapshot
+            frames = read_frames(path)
+            _, header = next(frames, (0, None))
+            if not header or header.get("type") != "snapshot":
+                raise LedgerCorruptionError(f"Missing snapshot header in {path}")
+
+            count = 0
+            trailer = None
+            for _, record in frames:
+                if record.get("type") == "snapshot_end":
+                    trailer = record
+                    break
+                count += 1
+                yield record
+            if trailer is None or trailer["records"] != count:
+                raise LedgerCorruptionError(f"Snapshot {path} is incomplete")
+
+        self._read_segment, self._read_offset = start_segment, start_offset
+        self._snapshot_position = None if snapshot is None else (start_segment, start_offset)
+        yield from self.read_new()
+
+    def read_new(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the records appended after the last one this process replayed, read or wrote.
+
+        The caller must hold `exclusive()` when other processes share the
+        directory, so that no frame is read half written. A frame cut short
+        at the end of the last segment can then only be a write that never
+        completed (and was never acknowledged) before a crash: it is cut off
+        the log.
+
+        Raises:
+            LedgerCorruptionError: If a frame fails its checksum, or a segment
+                other than the last ends in the middle of a frame
+        """
+        segments = self._segments()
+        for segment in segments:
+            if segment < self._read_segment:
+                continue
+            path = self._segment_path(segment)
+            offset = self._read_offset if segment == self._read_segment else 0
+            try:
+                for _, record in read_frames(path, offset):
+                    self._records_since_snapshot += 1
+                    yield record
+            except TornFrameError as e:
+                if segment != segments[-1]:
+                    raise
+                self._truncate_torn_tail(segment, e.offset)
+            self._read_segment, self._read_offset = segment, os.path.getsize(path)
+
+    def _truncate_torn_tail(self, segment: int, offset: int) -> None:
+        """Cut an incomplete frame off the end of the last segment. Caller holds the write lock."""
+        path = self._segment_path(segment)
+        logger.warning(
+            "Discarding %d bytes of an incomplete write at the end of %s (offset %d)",
+            os.path.getsize(path) - offset, path, offset
+        )
+        with self._cond:
+            os.truncate(path, offset)
+            if segment == self._segment:
+                self._offset = offset
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """
+        Hold the inter-process write lock of the directory.
+
+        On entry the writer moves to the end of the log, past anything other
+        processes appended; those records must be consumed with `read_new`
+        before appending.
+        """
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            self._follow_tail()
+            yield
+        finally:
+            with self._cond:
+                if self._file is not None:
+                    self._file.flush()
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _follow_tail(self) -> None:
+        """Point the writer at the current end of the log. Caller holds the write lock."""
+        self.sync()
+        with self._sync_lock:
+            with self._cond:
+                segment = max(self._segments(), default=self._segment)
+                if self._file is not None and segment != self._segment:
+                    # Another process started a new segment
+                    self._file.close()
+                    self._file = None
+                self._segment = segment
+                path = self._segment_path(segment)
+                self._offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+        # Another process wrote a snapshot, so one is not due here either
+        snapshot = self._latest_snapshot()
+        position = None if snapshot is None else (snapshot[1], snapshot[2])
+        if position != self._snapshot_position:
+            self._snapshot_position = position
+            self._records_since_snapshot = 0
+
+    def _open_writer(self) -> None:
+        """Open the last segment for appending and start the flusher."""
+        path = self._segment_path(self._segment)
+        self._file = open(path, "ab")
+        self._offset = self._file.tell()
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="ledger-flusher", daemon=True)
+            self._flusher.start()
+
+    def _roll_segment(self) -> None:
+        """Close the current segment and start the next one. Caller holds both locks."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._durable_lsn = self._written_lsn
+        self._cond.notify_all()
+
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), "ab")
+        self._offset = 0
+
+    def _write_frame(self, frame: bytes) -> int:
+        """Write a frame to the current segment. Caller holds the condition lock."""
+        self._file.write(frame)
+        self._offset += len(frame)
+        self._read_segment, self._read_offset = self._segment, self._offset
+        self._written_lsn += 1
+        self._records_since_snapshot += 1
+        self._cond.notify_all()
+        return self._written_lsn
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """
+        Append a record to the log without waiting for it to be durable.
+
+        Returns:
+            The log sequence number to pass to `wait_durable`
+        """
+        frame = encode_frame(record)
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Ledger store is closed")
+            if self._file is None:
+                self._open_writer()
+            if (self._read_segment, self._read_offset) != (self._segment, self._offset):
+                raise RuntimeError("Ledger has records from another process that were not read")
+            if self._offset < self.segment_bytes:
+                return self._write_frame(frame)
+
+        with self._sync_lock:
+            with self._cond:
+                if self._offset >= self.segment_bytes:
+                    self._roll_segment()
+                return self._write_frame(frame)
+
+    def wait_durable(self, lsn: int) -> None:
+        """Block until the record with the given sequence number has been fsynced."""
+        with self._cond:
+            while self._durable_lsn < lsn:
+                if self._closed:
+                    raise RuntimeError("Ledger store closed before the record was made durable")
+                self._cond.wait()
+
+    def commit(self, record: Dict[str, Any]) -> None:
+        """Append a record and wait until it is durable."""
+        self.wait_durable(self.append(record))
+
+    def sync(self) -> None:
+        """Flush and fsync everything written so far."""
+        with self._sync_lock:
+            with self._cond:
+                if self._file is None or self._durable_lsn == self._written_lsn:
+                    return
+                target = self._written_lsn
+                self._file.flush()
+                fd = self._file.fileno()
+
+            # fsync outside the condition lock so appends can continue meanwhile
+            os.fsync(fd)
+
+            with self._cond:
+                self._durable_lsn = max(self._durable_lsn, target)
+                self._cond.notify_all()
+
+    def _flush_loop(self) -> None:
+        """Background group commit: batch pending writes into a single fsync."""
+        while True:
+            with self._cond:
+                while self._durable_lsn == self._written_lsn and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+            # Give concurrent writers a chance to join this commit group
+            time.sleep(self.group_commit_interval)
+            self.sync()
+
+    def snapshot_due(self) -> bool:
+        """Return True once `snapshot_every` records were appended since the last snapshot and none is being written."""
+        if self._snapshotter is not None and self._snapshotter.is_alive():
+            return False
+        return self._records_since_snapshot >= self.snapshot_every
+
+    def position(self) -> Tuple[int, int]:
+        """Return the (segment, offset) of the end of the log written or read so far."""
+        with self._cond:
+            return self._read_segment, self._read_offset
+
+    def start_snapshot(self, records: Iterable[Dict[str, Any]], position: Tuple[int, int]) -> None:
+        """
+        Write a snapshot on a background thread (see `write_snapshot`).
+
+        `records` is consumed on that thread, so it must not change while
+        the snapshot is written: pass a copy of the ledger state.
+        """
+        self._records_since_snapshot = 0
+
+        def write() -> None:
+            try:
+                self.write_snapshot(records, position)
+            except Exception:
+                logger.exception("Writing a ledger snapshot failed")
+
+        self._snapshotter = threading.Thread(target=write, name="ledger-snapshot", daemon=True)
+        self._snapshotter.start()
+
+    def write_snapshot(self, records: Iterable[Dict[str, Any]], position: Tuple[int, int]) -> None:
+        """
+        Write a snapshot of the full ledger state and delete the log it makes unnecessary.
+
+        The caller must not hold `exclusive()`: the snapshot is published
+        under the directory's write lock.
+
+        Args:
+            records: Every record of the ledger up to `position`
+            position: Log position (as returned by `position`) `records` reflects
+        """
+        segment, offset = position
+        name = f"snapshot-{segment:08d}-{offset:012d}.snap"
+        tmp_path = self._path(f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(encode_frame({"type": "snapshot", "segment": segment, "offset": offset}))
+            count = 0
+            for record in records:
+                f.write(encode_frame(record))
+                count += 1
+            f.write(encode_frame({"type": "snapshot_end", "records": count}))
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._directory_lock():
+            previous = self._latest_snapshot()
+            if previous is not None and (previous[1], previous[2]) >= position:
+                # Another process published a snapshot at least as recent meanwhile
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self._path(name))
+            self._snapshot_position = position
+
+            # Older snapshots are superseded by this one
+            for existing in os.listdir(self.directory):
+                if SNAPSHOT_PATTERN.match(existing) and existing != name:
+                    os.remove(self._path(existing))
+
+            # Segments before the previous snapshot's position are needed by
+            # nobody: startup replays from this snapshot, and other processes
+            # catch up long before a whole snapshot interval is appended
+            if previous is not None:
+                for old_segment in self._segments():
+                    if old_segment < previous[1]:
+                        os.remove(self._segment_path(old_segment))
+
+    @contextmanager
+    def _directory_lock(self) -> Iterator[None]:
+        """Hold the inter-process write lock through a descriptor of its own, for threads other than the writer."""
+        fd = os.open(self._path("writer.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the descriptor releases its lock
+            os.close(fd)
+
+    def reset(self) -> None:
+        """
+        Delete every segment and snapshot, leaving an empty ledger.
+
+        For development only: other processes using the directory must be
+        stopped first, or they would keep serving the deleted records.
+        """
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        with self.exclusive():
+            with self._sync_lock:
+                with self._cond:
+                    if self._file is not None:
+                        self._file.close()
+                        self._file = None
+                    for name in os.listdir(self.directory):
+                        if SEGMENT_PATTERN.match(name) or SNAPSHOT_PATTERN.match(name) or (
+                            name.startswith("snapshot-") and name.endswith(".tmp")
+                        ):
+                            os.remove(self._path(name))
+                    self._segment, self._offset = 1, 0
+                    self._read_segment, self._read_offset = 1, 0
+                    self._durable_lsn = self._written_lsn
+                    self._snapshot_position = None
+                    self._records_since_snapshot = 0
+
+    def close(self) -> None:
+        """Finish the snapshot being written, make all pending records durable and stop the flusher."""
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self.sync()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._flusher is not None:
+            self._flusher.join()
+        os.close(self._lock_fd)
@@ -1,27 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from passlib.context import CryptContext
+from datetime import datetime, timedelta, timezone
 from models import User, UserRole
-from database import SessionLocal, engine
+from database import AsyncSessionLocal, SessionLocal, async_engine, async_pool_metrics, engine, pool_metrics
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from blockchain import blockchain
+from user_cache import CachedUser, user_cache
+from change_notifier import change_notifier
+from token_cache import CachedClaims, claims_cache
+from password_hashing import PasswordHasherBusy, password_hasher
+from chain_audit import chain_auditor
+from refresh_tokens import InvalidRefreshToken, issue_refresh_token, revoke_refresh_token, rotate_refresh_token
 from typing import Optional
 from config import config
+from contextlib import asynccontextmanager
+import json
 import os
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Make sure every ledger record is on disk before the process exits
+    blockchain.close()
+    password_hasher.close()
+    chain_auditor.close()
+    if change_notifier is not None:
+        change_notifier.close()
+    await async_engine.dispose()
+
+
 # Create FastAPI app with metadata
 app = FastAPI(
     title="Green Bonds API",
     description="A FastAPI backend for Green Bonds blockchain demo",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Users registered by another worker must not stay cached as unknown here
+if change_notifier is not None:
+    change_notifier.subscribe("users", user_cache.clear)
+
 # Updated CORS configuration to be more flexible
 origins = [
     "http://localhost:3000",
@@ -42,6 +69,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Dependency
@@ -52,7 +80,21 @@ def get_db():
     finally:
         db.close()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+async def get_async_db():
+    # Sync helpers run on it through `db.run_sync`, so their queries never block the event loop
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """Tell clients to back off when the password hashing queue is full."""
+    return Response(
+        content=json.dumps({"detail": str(exc)}),
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        media_type="application/json",
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 # Use JWT configuration from config
 SECRET_KEY = config.SECRET_KEY
@@ -68,27 +110,40 @@ class UserCreate(BaseModel):
 def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = pwd_context.hash(user.password)
-    db_user = User(username=user.username, hashed_password=hashed_password, role=user.role)
+def save_user(db: Session, db_user: User):
     db.add(db_user)
     db.commit()
+    # Drop any cached "no such user" lookups for the new user, here and in the other workers
+    user_cache.invalidate(user_id=db_user.id, username=db_user.username)
+    if change_notifier is not None:
+        change_notifier.bump("users")
+
+async def create_user(db: AsyncSession, user: UserCreate):
+    # bcrypt runs on the password hashing pool; database work stays off the event loop
+    hashed_password = await password_hasher.hash(user.password)
+    db_user = User(username=user.username, hashed_password=hashed_password, role=user.role)
+    await db.run_sync(save_user, db_user)
     return "complete"
 
 @app.post("/register")
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_username(db, username=user.username)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.run_sync(get_user_by_username, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return create_user(db=db, user=user)
+    return await create_user(db=db, user=user)
 
 # Authenticate the user
-def authenticate_user(username: str, password: str, db: Session):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await db.run_sync(get_user_by_username, username)
     if not user:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash is not None:
+        # The stored hash predates the current cost factor; upgrade it transparently
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 # User response model
@@ -109,14 +164,26 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwt
 
 @app.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Copy the user out before issuing the refresh token commits and expires it
+    user = CachedUser(user.id, user.username, user.role)
+    refresh_token = await db.run_sync(issue_refresh_token, user.id)
+    return token_response(user, refresh_token)
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+def token_response(user, refresh_token: str) -> dict:
+    """Build the login response: a fresh access token plus the given refresh token."""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username, "role": user.role.value}, expires_delta=access_token_expires
@@ -124,32 +191,75 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     return {
         "access_token": access_token,
         "token_type": "bearer",
+        "refresh_token": refresh_token,
         "user_id": user.id,
         "username": user.username,
         "role": user.role.value
     }
 
+
+@app.post("/token/refresh")
+async def refresh_access_token(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Exchange a refresh token for a new access token without re-entering the password.
+    
+    The refresh token is rotated: the response carries a new one and the old
+    one stops working. Reusing an old refresh token revokes the session.
+    """
+    try:
+        user_id, refresh_token = await db.run_sync(rotate_refresh_token, request.refresh_token)
+    except InvalidRefreshToken as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    
+    user = await db.run_sync(user_cache.get_by_id, user_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User no longer exists")
+    return token_response(user, refresh_token)
+
+
+@app.post("/token/revoke")
+async def revoke_token(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Log out: revoke a refresh token and every token rotated from the same login."""
+    await db.run_sync(revoke_refresh_token, request.refresh_token)
+    return {"message": "Refresh token revoked"}
+
+def decode_token(token: str) -> CachedClaims:
+    """
+    Return the verified claims of a bearer token, decoding it only on a cache miss.
+    
+    Raises:
+        JWTError: If the token is invalid or expired
+    """
+    entry = claims_cache.get(token)
+    if entry is None:
+        entry = claims_cache.put(token, jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+    return entry
+
+
 @app.get("/users/me", response_model=UserResponse)
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """Get the current user's information based on their authentication token."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+        entry = decode_token(token)
+        username: str = entry.claims.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
-    user = get_user_by_username(db, username=username)
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    # The user a token resolves to is cached along with its claims
+    if entry.principal is None:
+        user = await db.run_sync(user_cache.get_by_username, username)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        entry.principal = UserResponse(id=user.id, username=user.username, role=user.role)
     
-    return UserResponse(id=user.id, username=user.username, role=user.role)
+    return entry.principal
 
 
 def verify_token(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token).claims
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=403, detail="Token is invalid or expired")
@@ -162,9 +272,36 @@ async def verify_user_token(token: str):
     return {"message": "Token is valid"}
 
 
+@app.get("/auth/cache-stats")
+def get_auth_cache_stats(token: str = Depends(oauth2_scheme)):
+    """Get the hit rates of the token claims cache and the user cache."""
+    # Verify authentication
+    verify_token(token)
+    
+    return {
+        "claims": claims_cache.stats(),
+        "users": {
+            "hits": user_cache.hits,
+            "misses": user_cache.misses
+        }
+    }
+
+
+@app.get("/db/pool-stats")
+def get_db_pool_stats(token: str = Depends(oauth2_scheme)):
+    """Get the connection pool usage of the sync and async database engines."""
+    # Verify authentication
+    verify_token(token)
+    
+    return {
+        "sync": pool_metrics.stats(),
+        "async": async_pool_metrics.stats()
+    }
+
+
 # Blockchain related models and endpoints
-from typing import Optional, List, Dict, Any
-from blockchain import ComplianceStatus
+from typing import Optional, List, Dict, Any, Set, Union
+from blockchain import BatchValidationError, Block, ComplianceStatus
 
 class ContractCreate(BaseModel):
     issuer_id: int
@@ -207,12 +344,24 @@ class ContractResponse(BaseModel):
     previous_hash: str
 
 
+class ContractPage(BaseModel):
+    """A page of contracts with every user they reference, keyed by user ID (`expand=users`)."""
+    contracts: List[ContractResponse]
+    users: Dict[str, UserResponse]
+
+
+# Paginated contract listings return a bare list, or a ContractPage with expand=users
+CONTRACT_PAGE_RESPONSES = {200: {"description": "The contracts, or a ContractPage with `expand=users`"}}
+
+
 class ContractSearch(BaseModel):
     issuer_id: Optional[int] = None
     buyer_id: Optional[int] = None
     compliance_status: Optional[str] = None
     maturity_date_start: Optional[str] = None
     maturity_date_end: Optional[str] = None
+    # Full-text query: every word must start a word of the comment or a metadata value
+    q: Optional[str] = None
 
 
 @app.post("/contracts/", response_model=ContractResponse)
@@ -262,80 +411,297 @@ def create_contract(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/contracts/", response_model=list[ContractResponse])
-def get_all_contracts(token: str = Depends(oauth2_scheme)):
-    """Get all contracts from the blockchain."""
+@app.post("/contracts/batch", response_model=list[ContractResponse])
+def create_contracts_batch(
+    contracts: List[ContractCreate],
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+):
+    """
+    Add many green bond contracts to the blockchain in one request.
+    
+    The batch is all or nothing: if any item is invalid, nothing is added and
+    the error lists every failing item by its position in the request.
+    """
     # Verify authentication
     verify_token(token)
     
-    # Get all blocks (except genesis block if desired)
-    blocks = blockchain.get_all_blocks()[1:]  # Skip genesis block
-    
-    return [
-        ContractResponse(
-            index=block["index"],
-            timestamp=block["timestamp"],
-            issuer_id=block["issuer_id"],
-            buyer_id=block["buyer_id"],
-            comment=block["comment"],
-            bond_amount=block.get("bond_amount", 0.0),
-            maturity_date=block.get("maturity_date"),
-            yield_rate=block.get("yield_rate"),
-            compliance_status=block.get("compliance_status", ComplianceStatus.PENDING),
-            compliance_history=block.get("compliance_history", []),
-            metadata=block.get("metadata", {}),
-            hash=block["hash"],
-            previous_hash=block["previous_hash"]
-        ) for block in blocks
-    ]
+    if len(contracts) > config.CONTRACT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {config.CONTRACT_BATCH_MAX_ITEMS} contracts"
+        )
+    
+    try:
+        new_blocks = blockchain.add_blocks(
+            [contract.model_dump() for contract in contracts],
+            db=db
+        )
+    except BatchValidationError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "errors": e.errors})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return contracts_json_response(new_blocks)
+
+
+def contracts_json_response(blocks: List[Block], headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Build a JSON array of contracts from each block's cached encoding.
+    
+    The cached encodings already match ContractResponse, so the per-block
+    pydantic round trip is skipped.
+    """
+    body = b"[" + b",".join(block.to_json() for block in blocks) + b"]"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def contracts_page_response(
+    blocks: List[Block],
+    next_cursor: Optional[int],
+    expand: Optional[str] = None,
+    db: Optional[Session] = None
+) -> Response:
+    """
+    Respond with one page of contracts and the next cursor in a response header.
+    
+    Clients pass the returned `X-Next-Cursor` value as `cursor` to get the
+    following page; the header is absent on the last page. With
+    `expand="users"` the body becomes `{"contracts": [...], "users": {...}}`,
+    where `users` maps every issuer and buyer ID on the page to its user.
+    """
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else None
+    if expand != "users":
+        return contracts_json_response(blocks, headers)
+    
+    user_ids = {block.issuer_id for block in blocks} | {block.buyer_id for block in blocks}
+    users = {
+        str(user_id): user.model_dump(mode="json")
+        for user_id, user in users_by_id(db, user_ids).items()
+    }
+    body = (
+        b'{"contracts":[' + b",".join(block.to_json() for block in blocks)
+        + b'],"users":' + json.dumps(users, separators=(",", ":")).encode() + b"}"
+    )
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get(
+    "/contracts/",
+    response_model=Union[list[ContractResponse], ContractPage],
+    responses=CONTRACT_PAGE_RESPONSES
+)
+def get_all_contracts(
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    expand: Optional[str] = Query(None, pattern="^users$"),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+):
+    """Get contracts from the blockchain, optionally paginated by block index."""
+    # Verify authentication
+    verify_token(token)
+    
+    # Only the requested window of blocks is materialized (genesis excluded)
+    blocks, next_cursor = blockchain.get_blocks_page(
+        cursor=cursor,
+        limit=limit,
+        descending=(order == "desc")
+    )
+    return contracts_page_response(blocks, next_cursor, expand, db)
+
+
+MAX_USER_IDS = 1000
+
+# System/placeholder user shown as the buyer of new bonds (buyer_id 0)
+AVAILABLE_USER = UserResponse(id=0, username="Available", role=UserRole.BUYER)
+
+
+def users_by_id(db: Session, user_ids: Set[int]) -> Dict[int, UserResponse]:
+    """Look up users through the user cache, skipping ids that do not exist."""
+    users = {0: AVAILABLE_USER} if 0 in user_ids else {}
+    for user_id, user in user_cache.get_many(db, set(user_ids) - {0}).items():
+        if user is not None:
+            users[user_id] = UserResponse(id=user.id, username=user.username, role=user.role)
+    return users
+
+
+@app.get("/users", response_model=list[UserResponse])
+async def get_users_by_ids(ids: str = Query(..., description="Comma-separated user IDs"), db: AsyncSession = Depends(get_async_db)):
+    """Get several users by ID in one request; unknown IDs are left out."""
+    try:
+        user_ids = {int(user_id) for user_id in ids.split(",") if user_id.strip()}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(user_ids) > MAX_USER_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_USER_IDS} user IDs per request")
+    
+    users = await db.run_sync(users_by_id, user_ids)
+    return [users[user_id] for user_id in sorted(users)]
 
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-def get_user_by_id(user_id: int, db: Session = Depends(get_db)):
+async def get_user_by_id(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get user information by ID."""
     # If user_id is 0, it's a system/placeholder user for new bonds
     if user_id == 0:
-        return UserResponse(id=0, username="Available", role=UserRole.BUYER)
+        return AVAILABLE_USER
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.run_sync(user_cache.get_by_id, user_id)
     if not user:
         raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
     
     return UserResponse(id=user.id, username=user.username, role=user.role)
 
-@app.get("/contracts/public", response_model=list[ContractResponse])
-def get_public_contracts():
-    """Get all contracts from the blockchain without authentication."""
-    # Get all blocks (except genesis block)
-    blocks = blockchain.get_all_blocks()[1:]  # Skip genesis block
-    
-    return [
-        ContractResponse(
-            index=block["index"],
-            timestamp=block["timestamp"],
-            issuer_id=block["issuer_id"],
-            buyer_id=block["buyer_id"],
-            comment=block["comment"],
-            bond_amount=block.get("bond_amount", 0.0),
-            maturity_date=block.get("maturity_date"),
-            yield_rate=block.get("yield_rate"),
-            compliance_status=block.get("compliance_status", ComplianceStatus.PENDING),
-            compliance_history=block.get("compliance_history", []),
-            metadata=block.get("metadata", {}),
-            hash=block["hash"],
-            previous_hash=block["previous_hash"]
-        ) for block in blocks
-    ]
+
+@app.get(
+    "/users/{user_id}/holdings",
+    response_model=Union[list[ContractResponse], ContractPage],
+    responses=CONTRACT_PAGE_RESPONSES
+)
+def get_user_holdings(
+    user_id: int,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    expand: Optional[str] = Query(None, pattern="^users$"),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+):
+    """
+    Get the bonds a user currently holds, optionally paginated by block index.
+    
+    Each position is the block through which the user holds a bond: the
+    purchase of an available bond, or a bond issued directly to the user.
+    """
+    # Verify authentication
+    verify_token(token)
+    
+    indexes, next_cursor = blockchain.ownership.holdings_page(user_id, cursor, limit)
+    return contracts_page_response([blockchain.chain[index] for index in indexes], next_cursor, expand, db)
+
+
+@app.get(
+    "/contracts/public",
+    response_model=Union[list[ContractResponse], ContractPage],
+    responses=CONTRACT_PAGE_RESPONSES
+)
+def get_public_contracts(
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    expand: Optional[str] = Query(None, pattern="^users$"),
+    db: Session = Depends(get_db)
+):
+    """Get contracts from the blockchain without authentication, optionally paginated."""
+    # Only the requested window of blocks is materialized (genesis excluded)
+    blocks, next_cursor = blockchain.get_blocks_page(
+        cursor=cursor,
+        limit=limit,
+        descending=(order == "desc")
+    )
+    return contracts_page_response(blocks, next_cursor, expand, db)
+
+
+@app.get(
+    "/contracts/available",
+    response_model=Union[list[ContractResponse], ContractPage],
+    responses=CONTRACT_PAGE_RESPONSES
+)
+def get_available_contracts(
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    expand: Optional[str] = Query(None, pattern="^users$"),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+):
+    """
+    Get the bonds that are still available for purchase, optionally paginated by block index.
+    
+    Served from the ownership index, so only the returned bonds are read.
+    """
+    # Verify authentication
+    verify_token(token)
+    
+    indexes, next_cursor = blockchain.ownership.available_page(cursor, limit)
+    return contracts_page_response([blockchain.chain[index] for index in indexes], next_cursor, expand, db)
 
 
 @app.get("/contracts/validate")
-def validate_blockchain(token: str = Depends(oauth2_scheme)):
-    """Validate the integrity of the blockchain."""
+def validate_blockchain(full: bool = False, token: str = Depends(oauth2_scheme)):
+    """
+    Validate the integrity of the blockchain.
+    
+    Only blocks added or modified since the last validation are checked,
+    unless `full=true` is passed to re-hash the entire chain (full audit).
+    On long chains, POST /contracts/audit runs the full audit in the
+    background, on several cores.
+    """
     # Verify authentication
     verify_token(token)
     
-    is_valid = blockchain.is_chain_valid()
-    return {"valid": is_valid}
+    is_valid = blockchain.is_chain_valid(full=full)
+    return {"valid": is_valid, "full": full}
+
+
+@app.post("/contracts/audit", status_code=202)
+def start_chain_audit(token: str = Depends(oauth2_scheme)):
+    """
+    Start a full audit of the chain in the background and return the job.
+    
+    Every block is re-hashed on a pool of worker processes. Poll
+    GET /contracts/audit/{job_id} for its progress; once it finishes,
+    `first_bad_index` is the first block whose hash or link is wrong (None
+    if the chain is valid). If an audit is already running, it is returned
+    instead of starting another.
+    """
+    # Verify authentication
+    verify_token(token)
+    
+    return chain_auditor.start(blockchain).to_dict()
+
+
+@app.get("/contracts/audit/{job_id}")
+def get_chain_audit(job_id: str, token: str = Depends(oauth2_scheme)):
+    """Get the progress or outcome of a background audit."""
+    # Verify authentication
+    verify_token(token)
+    
+    job = chain_auditor.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Audit {job_id} not found")
+    return job
+
+
+EXPORT_CHUNK_BLOCKS = 256
+
+
+@app.get("/contracts/export")
+def export_contracts(start: int = Query(0, ge=0), token: str = Depends(oauth2_scheme)):
+    """
+    Stream the whole ledger as NDJSON, one block per line, in index order.
+    
+    Each line holds the block's fields as they were hashed, with its hash
+    and hash_version, so the export can be re-verified block by block;
+    compliance events are blocks of their own, so statuses are the ones the
+    blocks were appended with. The export includes the genesis block and
+    ends at the chain tip at the time of the request. To resume an
+    interrupted export, pass the last received index + 1 as `start`.
+    """
+    # Verify authentication
+    verify_token(token)
+    
+    def generate():
+        lines = []
+        for block in blockchain.iter_blocks(start):
+            lines.append(json.dumps(block.to_record(), separators=(",", ":")).encode() + b"\n")
+            if len(lines) >= EXPORT_CHUNK_BLOCKS:
+                yield b"".join(lines)
+                lines = []
+        if lines:
+            yield b"".join(lines)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @app.post("/contracts/{block_index}/compliance", response_model=ContractResponse)
@@ -395,25 +761,8 @@ def get_contract_by_index(
         if not block:
             raise HTTPException(status_code=404, detail=f"Block with index {block_index} not found")
         
-        # Convert block to dictionary
-        block_dict = block.to_dict()
-        
-        # Return the block data
-        return ContractResponse(
-            index=block.index,
-            timestamp=block_dict["timestamp"],
-            issuer_id=block.issuer_id,
-            buyer_id=block.buyer_id,
-            comment=block.comment,
-            bond_amount=block.bond_amount,
-            maturity_date=block.maturity_date,
-            yield_rate=block.yield_rate,
-            compliance_status=block.compliance_status,
-            compliance_history=block_dict["compliance_history"],
-            metadata=block.metadata,
-            hash=block.hash,
-            previous_hash=block.previous_hash
-        )
+        # Return the block's cached encoding
+        return Response(content=block.to_json(), media_type="application/json")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -423,37 +772,25 @@ def search_contracts(
     search_params: ContractSearch,
     token: str = Depends(oauth2_scheme)
 ):
-    """Search for contracts based on criteria."""
+    """
+    Search for contracts based on criteria.
+    
+    Results are in chain order, or ranked by relevance when `q` is given.
+    """
     # Verify authentication
     verify_token(token)
     
     # Search for blocks
-    blocks = blockchain.search_blocks(
+    blocks = blockchain.find_blocks(
         issuer_id=search_params.issuer_id,
         buyer_id=search_params.buyer_id,
         compliance_status=search_params.compliance_status,
         maturity_date_start=search_params.maturity_date_start,
-        maturity_date_end=search_params.maturity_date_end
+        maturity_date_end=search_params.maturity_date_end,
+        q=search_params.q
     )
     
-    # Convert to response model
-    return [
-        ContractResponse(
-            index=block["index"],
-            timestamp=block["timestamp"],
-            issuer_id=block["issuer_id"],
-            buyer_id=block["buyer_id"],
-            comment=block["comment"],
-            bond_amount=block.get("bond_amount", 0.0),
-            maturity_date=block.get("maturity_date"),
-            yield_rate=block.get("yield_rate"),
-            compliance_status=block.get("compliance_status", ComplianceStatus.PENDING),
-            compliance_history=block.get("compliance_history", []),
-            metadata=block.get("metadata", {}),
-            hash=block["hash"],
-            previous_hash=block["previous_hash"]
-        ) for block in blocks
-    ]
+    return contracts_json_response(blocks)
 
 
 @app.get("/contracts/{block_index}/compliance-history", response_model=list[ComplianceHistoryEntry])
@@ -471,3 +808,202 @@ def get_compliance_history(
         return history
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/contracts/{block_index}/compliance-history/{entry_index}/proof")
+def get_compliance_history_proof(
+    block_index: int,
+    entry_index: int,
+    token: str = Depends(oauth2_scheme)
+):
+    """Get a Merkle inclusion proof for one compliance history entry of a contract."""
+    # Verify authentication
+    verify_token(token)
+    
+    try:
+        return blockchain.get_history_proof(block_index, entry_index)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+class StatusBucket(BaseModel):
+    contracts: int
+    notional: float
+
+
+class MaturityBucket(BaseModel):
+    year: str
+    contracts: int
+    notional: float
+
+
+class PortfolioAnalyticsResponse(BaseModel):
+    contracts: int
+    total_notional: float
+    weighted_average_yield: Optional[float] = None
+    by_status: Dict[str, StatusBucket]
+    maturity_ladder: List[MaturityBucket]
+
+
+@app.get("/analytics", response_model=PortfolioAnalyticsResponse)
+def get_market_analytics(token: str = Depends(oauth2_scheme)):
+    """Get the portfolio aggregates of every contract on the chain."""
+    # Verify authentication
+    verify_token(token)
+    
+    return blockchain.analytics.market_summary()
+
+
+@app.get("/analytics/issuers/{issuer_id}", response_model=PortfolioAnalyticsResponse)
+def get_issuer_analytics(issuer_id: int, token: str = Depends(oauth2_scheme)):
+    """
+    Get the portfolio aggregates of the contracts issued by a user.
+    
+    Returns total notional, amount-weighted average yield, counts and
+    notional by compliance status, and a maturity ladder by year.
+    """
+    # Verify authentication
+    verify_token(token)
+    
+    return blockchain.analytics.issuer_summary(issuer_id)
+
+
+@app.get("/analytics/buyers/{buyer_id}", response_model=PortfolioAnalyticsResponse)
+def get_buyer_analytics(buyer_id: int, token: str = Depends(oauth2_scheme)):
+    """Get the portfolio aggregates of the contracts bought by a user (0: bonds still available)."""
+    # Verify authentication
+    verify_token(token)
+    
+    return blockchain.analytics.buyer_summary(buyer_id)
+
+
+MAX_GRAPH_NODES = 5000
+MAX_GRAPH_EDGES = 20000
+
+
+@app.get("/graph")
+def get_transaction_graph(
+    user_id: Optional[int] = None,
+    bond_id: Optional[int] = None,
+    hops: int = Query(2, ge=0, le=6),
+    max_nodes: int = Query(500, ge=1, le=MAX_GRAPH_NODES),
+    max_edges: int = Query(2000, ge=0, le=MAX_GRAPH_EDGES),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the graph of users and the bonds they issued or bought, ready to draw.
+    
+    With `user_id` or `bond_id` only the nodes within `hops` steps of that
+    node are returned; otherwise the whole graph is. When the caps are hit
+    the highest-degree nodes are kept and `truncated` is true.
+    """
+    if user_id is not None and bond_id is not None:
+        raise HTTPException(status_code=400, detail="Pass either user_id or bond_id, not both")
+    
+    center = None
+    if bond_id is not None:
+        if not blockchain.search_index.is_contract(bond_id):
+            raise HTTPException(status_code=404, detail=f"Contract {bond_id} not found")
+        center = ("bond", bond_id)
+    elif user_id is not None:
+        if user_id == 0 or not users_by_id(db, {user_id}):
+            raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
+        center = ("user", user_id)
+    
+    graph = blockchain.graph.subgraph(center, hops=hops, max_nodes=max_nodes, max_edges=max_edges)
+    users = users_by_id(db, {key for kind, key, _ in graph["nodes"] if kind == "user"})
+    
+    nodes = []
+    for kind, key, degree in graph["nodes"]:
+        if kind == "user":
+            user = users.get(key)
+            nodes.append({
+                "id": f"user-{key}",
+                "type": user.role.value if user else "unknown",
+                "user_id": key,
+                "name": user.username if user else f"User {key}",
+                "degree": degree
+            })
+        else:
+            block = blockchain.chain[key]
+            nodes.append({
+                "id": f"bond-{key}",
+                "type": "bond",
+                "index": key,
+                "name": f"Bond #{key}",
+                "amount": block.bond_amount,
+                "status": block.compliance_status,
+                "maturity": block.maturity_date,
+                "yield": block.yield_rate,
+                "hash": block.hash,
+                "degree": degree
+            })
+    
+    return {
+        "nodes": nodes,
+        "links": [
+            {"source": f"user-{user_id}", "target": f"bond-{index}", "type": relation}
+            for user_id, index, relation in graph["edges"]
+        ],
+        "truncated": graph["truncated"]
+    }
+
+
+MAX_TIMELINE_BUCKETS = 5000
+
+
+def epoch_seconds(moment: Optional[datetime]) -> Optional[float]:
+    """Convert a query datetime to epoch seconds, reading naive datetimes as UTC."""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+@app.get("/timeline")
+def get_timeline(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Optional[str] = Query(None, pattern="^(minute|hour|day|month)$"),
+    max_buckets: int = Query(500, ge=1, le=MAX_TIMELINE_BUCKETS)
+):
+    """
+    Get contract counts, notional and status mix over time, in UTC-aligned buckets.
+    
+    Only buckets holding contracts are returned, oldest first, covering
+    [start, end). Without `granularity` the finest one with at most
+    `max_buckets` buckets in the range is used. Each bucket's contracts can
+    be paged through with /timeline/blocks.
+    """
+    start_seconds, end_seconds = epoch_seconds(start), epoch_seconds(end)
+    if granularity is None:
+        granularity = blockchain.timeline.choose_granularity(start_seconds, end_seconds, max_buckets) or "month"
+    if blockchain.timeline.count_buckets(granularity, start_seconds, end_seconds) > max_buckets:
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than {max_buckets} {granularity} buckets in range; narrow the range or use a coarser granularity"
+        )
+    
+    return {
+        "granularity": granularity,
+        "buckets": blockchain.timeline.buckets(granularity, start_seconds, end_seconds)
+    }
+
+
+@app.get("/timeline/blocks", response_model=list[ContractResponse])
+def get_timeline_bucket_blocks(
+    granularity: str = Query(..., pattern="^(minute|hour|day|month)$"),
+    bucket: datetime = Query(..., description="Any time within the bucket, e.g. its start"),
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Get one page of the contracts in a timeline bucket, in time order.
+    
+    Pass the returned `X-Next-Cursor` header as `cursor` to get the next
+    page; the header is absent on the last page.
+    """
+    indexes, next_cursor = blockchain.timeline.bucket_blocks(granularity, epoch_seconds(bucket), cursor, limit)
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else None
+    return contracts_json_response([blockchain.chain[index] for index in indexes], headers)
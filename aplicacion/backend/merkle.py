@@ -0,0 +1,111 @@
+import hashlib
+import json
+from typing import Any, Dict, List
+
+# Domain separation between leaf and interior node hashes (as in RFC 6962)
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+EMPTY_ROOT = hashlib.sha256(b"").digest()
+
+
+def leaf_hash(data: bytes) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def canonical_json(value: Any) -> bytes:
+    """Deterministic JSON encoding used for Merkle leaves."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
+
+def history_leaf(entry: Dict[str, Any]) -> bytes:
+    """Leaf hash of a single compliance history entry."""
+    return leaf_hash(canonical_json(entry))
+
+
+def metadata_leaves(metadata: Dict[str, Any]) -> List[bytes]:
+    """Leaf hashes of a metadata dict, one per key in sorted key order."""
+    return [leaf_hash(canonical_json([key, metadata[key]])) for key in sorted(metadata)]
+
+
+def _largest_power_of_two_below(n: int) -> int:
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """Root of the RFC 6962 Merkle tree over the given leaf hashes."""
+    if not leaves:
+        return EMPTY_ROOT
+    if len(leaves) == 1:
+        return leaves[0]
+    split = _largest_power_of_two_below(len(leaves))
+    return node_hash(merkle_root(leaves[:split]), merkle_root(leaves[split:]))
+
+
+def append_leaf(peaks: List[bytes], size: int, leaf: bytes) -> List[bytes]:
+    """
+    Add a leaf to a Merkle frontier in O(log n).
+
+    Args:
+        peaks: Roots of the perfect subtrees covering the existing leaves, largest first
+        size: Number of leaves already in the tree
+        leaf: Hash of the new leaf
+
+    Returns:
+        The peaks of the tree with the new leaf appended
+    """
+    peaks = peaks + [leaf]
+    while size & 1:
+        right = peaks.pop()
+        left = peaks.pop()
+        peaks.append(node_hash(left, right))
+        size >>= 1
+    return peaks
+
+
+def root_from_peaks(peaks: List[bytes]) -> bytes:
+    """Fold the frontier peaks into the RFC 6962 root in O(log n)."""
+    if not peaks:
+        return EMPTY_ROOT
+    root = peaks[-1]
+    for peak in reversed(peaks[:-1]):
+        root = node_hash(peak, root)
+    return root
+
+
+def inclusion_proof(leaves: List[bytes], index: int) -> List[bytes]:
+    """RFC 6962 audit path for the leaf at `index`, from the leaf level up."""
+    if len(leaves) <= 1:
+        return []
+    split = _largest_power_of_two_below(len(leaves))
+    if index < split:
+        return inclusion_proof(leaves[:split], index) + [merkle_root(leaves[split:])]
+    return inclusion_proof(leaves[split:], index - split) + [merkle_root(leaves[:split])]
+
+
+def verify_inclusion(leaf: bytes, index: int, size: int, proof: List[bytes], root: bytes) -> bool:
+    """Check an audit path produced by `inclusion_proof` (RFC 9162, section 2.1.3.2)."""
+    if index >= size:
+        return False
+
+    node, last = index, size - 1
+    computed = leaf
+    for sibling in proof:
+        if last == 0:
+            return False
+        if node & 1 or node == last:
+            computed = node_hash(sibling, computed)
+            if not node & 1:
+                while node and not node & 1:
+                    node >>= 1
+                    last >>= 1
+        else:
+            computed = node_hash(computed, sibling)
+        node >>= 1
+        last >>= 1
+
+    return last == 0 and computed == root
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Enum
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Enum
+from sqlalchemy.exc import OperationalError
 import enum
 from database import Base
 from database import engine
@@ -15,6 +16,23 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(Enum(UserRole), default=UserRole.BUYER, nullable=False)
 
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # SHA-256 of the token; the token itself is only ever held by the client
+    token_hash = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    # Every token obtained by rotating a login's first token shares its family
+    family_id = Column(String, index=True, nullable=False)
+    # Indexed for the purge of unusable tokens on every issue
+    expires_at = Column(DateTime, index=True, nullable=False)
+    revoked_at = Column(DateTime, index=True, nullable=True)
+
 # Create the database tables if they don't exist
 
-User.metadata.create_all(bind=engine)
+try:
+    User.metadata.create_all(bind=engine)
+except OperationalError:
+    # Another worker process created them between the check and the CREATE
+    User.metadata.create_all(bind=engine)
@@ -0,0 +1,112 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+# Metadata key of a purchase block naming the bond it buys
+ORIGINAL_BOND_KEY = "original_bond_id"
+
+
+def purchased_bond(block) -> Optional[object]:
+    """Return the bond a contract block purchases (None if it is not a purchase)."""
+    return block.metadata.get(ORIGINAL_BOND_KEY)
+
+
+class OwnershipIndex:
+    """
+    Current holder of every bond, maintained incrementally.
+
+    A contract either issues a bond, directly to its buyer or with buyer 0
+    (available for purchase), or purchases an available bond by naming it in
+    `metadata.original_bond_id`. The index maps each issued bond to its
+    holder, each holder to its positions (the blocks through which it holds
+    a bond, in chain order) and keeps the available bonds sorted, so
+    listings cost the size of their result. Purchases of a bond that was not
+    available when they were appended (already sold, unknown or not an
+    issued bond) change nothing and are recorded in `conflicts`; new ones
+    are rejected by the chain's writer. Updates and reads share a short lock.
+    """
+
+    def __init__(self):
+        # Issued bond -> holder's user ID (0 while available)
+        self.owners: Dict[int, int] = {}
+        # Sold bond -> index of the purchase block
+        self.purchases: Dict[int, int] = {}
+        # Holder -> position block indexes, in chain order
+        self.positions: Dict[int, array] = {}
+        # Bonds still available for purchase, sorted by index
+        self.available = array("q")
+        # Purchase blocks that named a bond which was not available
+        self.conflicts = array("q")
+        self._lock = threading.Lock()
+
+    def owner_of(self, bond_index) -> Optional[int]:
+        """Return the holder of an issued bond (0 while available, None if it is not an issued bond)."""
+        return self.owners.get(bond_index) if type(bond_index) is int else None
+
+    def add_block(self, block) -> None:
+        """Record the bond a newly appended contract block issues or purchases."""
+        index = block.index
+        if index == 0:
+            return
+
+        buyer_id = block.buyer_id
+        bond_index = purchased_bond(block)
+        with self._lock:
+            if bond_index is None:
+                self.owners[index] = buyer_id
+                if buyer_id == 0:
+                    # Blocks are appended in order, so the array stays sorted
+                    self.available.append(index)
+                else:
+                    self._add_position(buyer_id, index)
+                return
+
+            if buyer_id == 0 or self.owner_of(bond_index) != 0:
+                self.conflicts.append(index)
+                return
+
+            self.owners[bond_index] = buyer_id
+            self.purchases[bond_index] = index
+            del self.available[bisect_left(self.available, bond_index)]
+            self._add_position(buyer_id, index)
+
+    def _add_position(self, holder_id: int, index: int) -> None:
+        """Append a position to a holder's list. Caller holds the lock."""
+        positions = self.positions.get(holder_id)
+        if positions is None:
+            positions = self.positions[holder_id] = array("q")
+        positions.append(index)
+
+    @staticmethod
+    def _page(indexes: array, cursor: Optional[int], limit: Optional[int]) -> Tuple[List[int], Optional[int]]:
+        """Return the indexes after `cursor` and the next cursor (None on the last page)."""
+        start = 0 if cursor is None else bisect_right(indexes, cursor)
+        stop = len(indexes) if limit is None else min(len(indexes), start + limit)
+        page = indexes[start:stop].tolist()
+        return page, page[-1] if page and stop < len(indexes) else None
+
+    def available_page(self, cursor: Optional[int] = None, limit: Optional[int] = None) -> Tuple[List[int], Optional[int]]:
+        """
+        Return a page of the bonds available for purchase, by block index.
+
+        Returns:
+            Tuple of (bond indexes, cursor for the next page or None)
+        """
+        with self._lock:
+            return self._page(self.available, cursor, limit)
+
+    def holdings_page(
+        self,
+        holder_id: int,
+        cursor: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[int], Optional[int]]:
+        """
+        Return a page of a user's positions, by block index.
+
+        Returns:
+            Tuple of (position block indexes, cursor for the next page or None)
+        """
+        with self._lock:
+            return self._page(self.positions.get(holder_id, array("q")), cursor, limit)
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from config import config
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many password operations in progress")
+        self.retry_after = retry_after
+
+
+@lru_cache(maxsize=None)
+def _crypt_context(rounds: int) -> CryptContext:
+    """Password context hashing with bcrypt at the given cost factor (one per process)."""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# Module-level so they can be sent to worker processes
+
+def _hash(password: str, rounds: int) -> str:
+    return _crypt_context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _crypt_context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the request workers, on a bounded pool of processes.
+
+    At most `max_pending` operations may be queued or running at once;
+    beyond that `hash` and `verify` fail fast with PasswordHasherBusy instead
+    of queueing, so a burst of logins cannot pile up behind the pool. With
+    `workers=0` the work runs on a thread pool in the serving process.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_pending: int = 8,
+        rounds: int = 12,
+        retry_after: int = 1
+    ):
+        """
+        Args:
+            workers: Number of worker processes (0 to use threads instead)
+            max_pending: Maximum number of queued or running operations
+            rounds: bcrypt cost factor for new hashes; older hashes are upgraded on login
+            retry_after: Seconds clients are told to wait when the queue is full
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # Spawned workers do not inherit the server's threads and open files
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(thread_name_prefix="password-hasher")
+            return self._executor
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy(self.retry_after)
+            self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._get_executor().submit(func, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured cost factor.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full
+        """
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password against its hash.
+
+        Returns:
+            Tuple of (valid, new hash). The new hash is set when the password is
+            valid but its hash uses an outdated scheme or cost factor, and
+            should replace the stored one.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full
+        """
+        return await self._submit(_verify_and_update, password, hashed, self.rounds)
+
+    def close(self) -> None:
+        """Shut the worker pool down."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+    rounds=config.BCRYPT_ROUNDS,
+    retry_after=config.PASSWORD_HASH_RETRY_AFTER
+)
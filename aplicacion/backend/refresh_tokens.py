@@ -0,0 +1,107 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.orm import Session
+
+from config import config
+from models import RefreshToken
+
+
+class InvalidRefreshToken(Exception):
+    """Raised when a refresh token is unknown, expired, revoked or reused."""
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def purge_refresh_tokens(db: Session, now: datetime) -> None:
+    """
+    Delete the tokens that can no longer be used, leaving the commit to the caller.
+
+    Expired tokens go, and so do tokens revoked (used or logged out) longer
+    ago than a token lives. Used tokens of a live family are kept until
+    then, so that presenting one again is still detected as a reuse.
+    """
+    lifetime = timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS)
+    db.execute(
+        delete(RefreshToken)
+        .where(or_(RefreshToken.expires_at <= now, RefreshToken.revoked_at <= now - lifetime))
+    )
+
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """
+    Create and store a new refresh token for a user, deleting expired ones.
+
+    Args:
+        db: Database session (committed by this function)
+        user_id: ID of the user the token authenticates
+        family_id: Family of the token being rotated (None starts a new family)
+
+    Returns:
+        The refresh token; only its hash is stored
+    """
+    now = datetime.utcnow()
+    token = secrets.token_urlsafe(32)
+    purge_refresh_tokens(db, now)
+    db.add(RefreshToken(
+        token_hash=_token_hash(token),
+        user_id=user_id,
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=now + timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    db.commit()
+    return token
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[int, str]:
+    """
+    Exchange a refresh token for a new one in the same family.
+
+    Each token can be used once. Presenting a token that was already rotated
+    means it was copied, so the whole family is revoked.
+
+    Returns:
+        Tuple of (user ID, new refresh token)
+
+    Raises:
+        InvalidRefreshToken: If the token cannot be used
+    """
+    now = datetime.utcnow()
+    stored = db.query(RefreshToken).filter(RefreshToken.token_hash == _token_hash(token)).first()
+    if stored is None or stored.expires_at <= now:
+        raise InvalidRefreshToken("Refresh token is invalid or expired")
+
+    # Only one concurrent request can consume the token
+    consumed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    ).rowcount
+    if not consumed:
+        db.rollback()
+        revoke_family(db, stored.family_id)
+        raise InvalidRefreshToken("Refresh token was already used; the session has been revoked")
+
+    return stored.user_id, issue_refresh_token(db, stored.user_id, stored.family_id)
+
+
+def revoke_family(db: Session, family_id: str) -> None:
+    """Revoke every live token of a family (e.g. on logout or detected reuse)."""
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+def revoke_refresh_token(db: Session, token: str) -> None:
+    """Revoke the family of a refresh token; unknown tokens are ignored."""
+    stored = db.query(RefreshToken).filter(RefreshToken.token_hash == _token_hash(token)).first()
+    if stored is not None:
+        revoke_family(db, stored.family_id)
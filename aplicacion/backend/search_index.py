@@ -0,0 +1,141 @@
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Callable, Collection, Dict, List, Optional, Set, Sized, Tuple
+
+
+class SearchIndex:
+    """
+    Secondary indexes over the blockchain, maintained incrementally.
+
+    Maps issuer_id, buyer_id, compliance_status and maturity_date to block
+    indexes, and keeps the distinct maturity dates sorted for range queries.
+    Only contract blocks are indexed: the genesis block and compliance
+    events are not.
+
+    Searches may run while the chain's writer updates the index. Posting
+    lists only grow, a block moving between status buckets is added to the
+    new one before leaving the old one (and re-checked by the search), and
+    the sorted maturity dates are changed and read under a short lock.
+    """
+
+    def __init__(self):
+        # Every indexed block, in chain order
+        self.contracts = array("q")
+
+        # Posting lists are typed arrays to keep them at 8 bytes per entry
+        self.by_issuer: Dict[int, array] = defaultdict(lambda: array("q"))
+        self.by_buyer: Dict[int, array] = defaultdict(lambda: array("q"))
+        self.by_status: Dict[str, Set[int]] = defaultdict(set)
+
+        # Maturity date -> blocks, and the distinct dates in order. Many bonds
+        # share a date, so a new one (inserted in the sorted list) is rare.
+        self.by_maturity: Dict[str, array] = {}
+        self.maturity_dates: List[str] = []
+        self._maturity_lock = threading.Lock()
+
+    def add_block(self, block) -> None:
+        """Index a newly appended block."""
+        index = block.index
+        if index == 0:
+            return
+
+        # Blocks are appended in order, so these lists stay sorted
+        self.contracts.append(index)
+        self.by_issuer[block.issuer_id].append(index)
+        self.by_buyer[block.buyer_id].append(index)
+        self.by_status[block.compliance_status].add(index)
+
+        maturity_date = block.maturity_date
+        if maturity_date is not None:
+            postings = self.by_maturity.get(maturity_date)
+            if postings is None:
+                # Keep a single copy of each date
+                maturity_date = sys.intern(maturity_date)
+                postings = array("q")
+                with self._maturity_lock:
+                    self.by_maturity[maturity_date] = postings
+                    self.maturity_dates.insert(bisect_left(self.maturity_dates, maturity_date), maturity_date)
+            postings.append(index)
+
+    def update_status(self, index: int, old_status: str, new_status: str) -> None:
+        """Move a block between compliance status buckets."""
+        self.by_status[new_status].add(index)
+        if old_status != new_status:
+            self.by_status[old_status].discard(index)
+
+    def is_contract(self, index: int) -> bool:
+        """Return True if the block at `index` is an indexed contract."""
+        position = bisect_left(self.contracts, index)
+        return position < len(self.contracts) and self.contracts[position] == index
+
+    def _maturity_range(self, start: Optional[str], end: Optional[str]) -> array:
+        """Return the indexes of blocks maturing within [start, end], grouped by date."""
+        with self._maturity_lock:
+            low = bisect_left(self.maturity_dates, start) if start is not None else 0
+            high = bisect_right(self.maturity_dates, end) if end is not None else len(self.maturity_dates)
+            postings = [self.by_maturity[date] for date in self.maturity_dates[low:high]]
+
+        indexes = array("q")
+        for dated in postings:
+            indexes.extend(dated)
+        return indexes
+
+    def search(
+        self,
+        chain: List,
+        issuer_id: Optional[int] = None,
+        buyer_id: Optional[int] = None,
+        compliance_status: Optional[str] = None,
+        maturity_date_start: Optional[str] = None,
+        maturity_date_end: Optional[str] = None,
+        within: Optional[Collection[int]] = None
+    ) -> List[int]:
+        """
+        Return the sorted indexes of the blocks matching every given filter.
+
+        The smallest candidate set is materialized first and the remaining
+        filters are applied to it in order of increasing selectivity, so the
+        cost is bounded by the smallest candidate set rather than the chain.
+        `within` restricts the result to a set of blocks found elsewhere,
+        such as the matches of a full-text query.
+        """
+        # Each entry: (candidate set, predicate checking a block against the filter)
+        filters: List[Tuple[Sized, Callable]] = []
+
+        if issuer_id is not None:
+            filters.append((self.by_issuer.get(issuer_id, ()),
+                            lambda block: block.issuer_id == issuer_id))
+        if buyer_id is not None:
+            filters.append((self.by_buyer.get(buyer_id, ()),
+                            lambda block: block.buyer_id == buyer_id))
+        if compliance_status is not None:
+            filters.append((self.by_status.get(compliance_status, set()),
+                            lambda block: block.compliance_status == compliance_status))
+        if maturity_date_start is not None or maturity_date_end is not None:
+            filters.append((
+                self._maturity_range(maturity_date_start, maturity_date_end),
+                lambda block: block.maturity_date is not None
+                and (maturity_date_start is None or block.maturity_date >= maturity_date_start)
+                and (maturity_date_end is None or block.maturity_date <= maturity_date_end)
+            ))
+        if within is not None:
+            filters.append((within, lambda block: block.index in within))
+
+        if not filters:
+            return list(self.contracts)
+
+        filters.sort(key=lambda entry: len(entry[0]))
+        candidates, predicate = filters[0]
+        predicates = [predicate for _, predicate in filters[1:]]
+        if isinstance(candidates, set):
+            # A status bucket may briefly hold a block that is moving to another one
+            predicates.append(predicate)
+
+        # Copy the candidates in one step, as the writer may be adding to them
+        return sorted(
+            index for index in list(candidates)
+            if all(predicate(chain[index]) for predicate in predicates)
+        )
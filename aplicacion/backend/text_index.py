@@ -0,0 +1,164 @@
+import math
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+# Words are runs of letters and digits, compared case-insensitively
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Sorted tokens are split into chunks of this many (up to twice as many before
+# a split), so inserting a token only shifts its chunk
+TOKEN_CHUNK_SIZE = 1024
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def metadata_strings(value: Any) -> Iterator[str]:
+    """Yield every string value in a metadata structure (keys are left out)."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from metadata_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from metadata_strings(item)
+
+
+class TextIndex:
+    """
+    Inverted index over the words of contract comments and metadata values.
+
+    Each token maps to the blocks containing it, in chain order, with the
+    number of times it occurs in each. Query terms are prefixes: a block
+    matches when every term starts one of its tokens, and blocks are ranked
+    by tf-idf over the tokens matched. The tokens are also kept sorted, in
+    chunks, so a prefix expands to its tokens by binary search. Like the
+    search index, only contract blocks are indexed.
+
+    Searches may run while the chain's writer updates the index: posting
+    lists only grow, and the sorted tokens are changed and read under a
+    short lock.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, array] = {}
+        self.frequencies: Dict[str, array] = {}
+        # Sorted runs of tokens, and the last token of each
+        self.token_chunks: List[List[str]] = []
+        self.chunk_maxes: List[str] = []
+        self.documents = 0
+        # Held while a token is inserted into the chunks or a prefix looked up in them
+        self._tokens_lock = threading.Lock()
+
+    def add_block(self, block) -> None:
+        """Index the comment and metadata values of a newly appended block."""
+        index = block.index
+        if index == 0:
+            return
+
+        counts = Counter(tokenize(block.comment))
+        for value in metadata_strings(block.metadata):
+            counts.update(tokenize(value))
+
+        for token, count in counts.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                token = sys.intern(token)
+                self.frequencies[token] = array("I")
+                postings = self.postings[token] = array("q")
+                self._insert_token(token)
+            # Frequency first: readers pair the two arrays up to the postings' length
+            self.frequencies[token].append(count)
+            postings.append(index)
+        self.documents += 1
+
+    def _insert_token(self, token: str) -> None:
+        """Add a token to the sorted chunks, splitting a chunk that grew too large."""
+        chunks, maxes = self.token_chunks, self.chunk_maxes
+        with self._tokens_lock:
+            if not chunks:
+                chunks.append([token])
+                maxes.append(token)
+                return
+            position = bisect_left(maxes, token)
+            if position == len(maxes):
+                position -= 1
+                chunks[position].append(token)
+                maxes[position] = token
+            else:
+                insort(chunks[position], token)
+            chunk = chunks[position]
+            if len(chunk) > 2 * TOKEN_CHUNK_SIZE:
+                chunks[position:position + 1] = [chunk[:TOKEN_CHUNK_SIZE], chunk[TOKEN_CHUNK_SIZE:]]
+                maxes[position:position + 1] = [chunk[TOKEN_CHUNK_SIZE - 1], chunk[-1]]
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Return the indexed tokens starting with `prefix`."""
+        matches: List[str] = []
+        with self._tokens_lock:
+            for chunk in self.token_chunks[bisect_left(self.chunk_maxes, prefix):]:
+                position = end = bisect_left(chunk, prefix)
+                while end < len(chunk) and chunk[end].startswith(prefix):
+                    end += 1
+                matches.extend(chunk[position:end])
+                if end < len(chunk):
+                    break
+        return matches
+
+    def _term_scores(self, term: str, within: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+        """
+        Return the tf-idf score of every block with a token starting with `term`.
+
+        With `within`, only those blocks are scored; posting lists longer than
+        `within` are probed by binary search instead of being read in full.
+        """
+        scores: Dict[int, float] = {}
+        documents = max(self.documents, 1)
+        for token in self._expand(term):
+            postings = self.postings[token]
+            frequencies = self.frequencies[token]
+            size = len(postings)
+            idf = math.log(1 + documents / size)
+            if within is not None and len(within) < size:
+                for index in within:
+                    position = bisect_left(postings, index, 0, size)
+                    if position < size and postings[position] == index:
+                        scores[index] = scores.get(index, 0.0) + frequencies[position] * idf
+                continue
+            for index, count in zip(postings, frequencies):
+                if within is None or index in within:
+                    scores[index] = scores.get(index, 0.0) + count * idf
+        return scores
+
+    def search(self, query: str) -> Dict[int, float]:
+        """
+        Return the relevance score of every block matching all terms of a query.
+
+        The term with the fewest postings is scored first and each later
+        term only scores the blocks still matching, so the cost is bounded
+        by the shortest posting lists rather than the chain.
+        """
+        terms = sorted(set(tokenize(query)), key=lambda term: sum(
+            len(self.postings[token]) for token in self._expand(term)
+        ))
+        if not terms:
+            return {}
+
+        scores = self._term_scores(terms[0])
+        for term in terms[1:]:
+            if not scores:
+                break
+            term_scores = self._term_scores(term, scores)
+            scores = {
+                index: score + term_scores[index]
+                for index, score in scores.items() if index in term_scores
+            }
+        return scores
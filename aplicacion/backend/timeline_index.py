@@ -0,0 +1,190 @@
+import calendar
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from ownership_index import purchased_bond
+
+# Bucket widths in seconds; months are calendar months (UTC)
+GRANULARITIES = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "month": None,
+}
+
+
+def bucket_start(timestamp: float, granularity: str) -> int:
+    """Return the start (UTC epoch seconds) of the bucket holding a timestamp."""
+    width = GRANULARITIES[granularity]
+    if width is not None:
+        return int(timestamp // width) * width
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return calendar.timegm((moment.year, moment.month, 1, 0, 0, 0))
+
+
+def bucket_end(start: int, granularity: str) -> int:
+    """Return the end (exclusive) of the bucket starting at `start`."""
+    width = GRANULARITIES[granularity]
+    if width is not None:
+        return start + width
+    moment = datetime.fromtimestamp(start, timezone.utc)
+    year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+class Histogram:
+    """
+    Sparse histogram of contracts over time at one granularity.
+
+    Only buckets holding contracts exist. Their starts are kept sorted in a
+    typed array, with each bucket's [contracts, notional, {status: contracts}]
+    in a parallel list.
+    """
+
+    def __init__(self, granularity: str):
+        self.granularity = granularity
+        self.starts = array("q")
+        self.buckets: List[List] = []
+
+    def _bucket(self, start: int) -> List:
+        """Return the bucket starting at `start`, creating it if needed."""
+        # Blocks arrive in time order, so the bucket is almost always the last one
+        if self.starts and self.starts[-1] == start:
+            return self.buckets[-1]
+        position = bisect_left(self.starts, start)
+        if position < len(self.starts) and self.starts[position] == start:
+            return self.buckets[position]
+        bucket = [0, 0.0, {}]
+        self.starts.insert(position, start)
+        self.buckets.insert(position, bucket)
+        return bucket
+
+    def add(self, timestamp: float, amount: float, status: str) -> None:
+        """Count a contract in the bucket holding its timestamp."""
+        bucket = self._bucket(bucket_start(timestamp, self.granularity))
+        bucket[0] += 1
+        bucket[1] += amount
+        bucket[2][status] = bucket[2].get(status, 0) + 1
+
+    def move(self, timestamp: float, old_status: str, new_status: str) -> None:
+        """Move a contract between compliance statuses in the bucket holding its timestamp."""
+        statuses = self._bucket(bucket_start(timestamp, self.granularity))[2]
+        statuses[old_status] -= 1
+        if not statuses[old_status]:
+            del statuses[old_status]
+        statuses[new_status] = statuses.get(new_status, 0) + 1
+
+    def span(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        """Return the positions of the buckets overlapping [start, end)."""
+        low = 0 if start is None else bisect_left(self.starts, bucket_start(start, self.granularity))
+        high = len(self.starts) if end is None else bisect_left(self.starts, end)
+        return low, high
+
+
+class TimelineIndex:
+    """
+    Contract counts, notional and status mix over time, maintained incrementally.
+
+    Keeps a histogram per granularity (minute, hour, day and month, aligned
+    to UTC) keyed on Block.timestamp, so any range loads in time
+    proportional to the buckets returned. Contracts are also kept sorted by
+    timestamp to page through the blocks of one bucket. Like the search
+    index, only contract blocks are counted; purchases are not new
+    contracts and are left out, so a sold bond is counted once, when it was
+    issued. The writer's updates and the readers' copies share a short lock.
+    """
+
+    def __init__(self):
+        self.histograms = {granularity: Histogram(granularity) for granularity in GRANULARITIES}
+        # Parallel arrays sorted by timestamp (ties keep chain order)
+        self.timestamps = array("d")
+        self.indexes = array("q")
+        self._lock = threading.Lock()
+
+    def add_block(self, block) -> None:
+        """Count a newly appended contract block (purchases are left out)."""
+        if block.index == 0 or purchased_bond(block) is not None:
+            return
+
+        timestamp = block.timestamp
+        amount = block.bond_amount or 0.0
+        status = block.compliance_status
+        with self._lock:
+            for histogram in self.histograms.values():
+                histogram.add(timestamp, amount, status)
+            if not self.timestamps or self.timestamps[-1] <= timestamp:
+                self.timestamps.append(timestamp)
+                self.indexes.append(block.index)
+            else:
+                position = bisect_right(self.timestamps, timestamp)
+                self.timestamps.insert(position, timestamp)
+                self.indexes.insert(position, block.index)
+
+    def update_status(self, block, old_status: str, new_status: str) -> None:
+        """Move a contract between compliance statuses in the buckets holding it."""
+        if old_status == new_status or purchased_bond(block) is not None:
+            return
+
+        with self._lock:
+            for histogram in self.histograms.values():
+                histogram.move(block.timestamp, old_status, new_status)
+
+    def choose_granularity(self, start: Optional[float], end: Optional[float], max_buckets: int) -> Optional[str]:
+        """Return the finest granularity with at most `max_buckets` buckets in the range (None if none fits)."""
+        with self._lock:
+            for granularity, histogram in self.histograms.items():
+                low, high = histogram.span(start, end)
+                if high - low <= max_buckets:
+                    return granularity
+        return None
+
+    def count_buckets(self, granularity: str, start: Optional[float], end: Optional[float]) -> int:
+        """Return how many non-empty buckets of a granularity overlap the range."""
+        with self._lock:
+            low, high = self.histograms[granularity].span(start, end)
+        return high - low
+
+    def buckets(self, granularity: str, start: Optional[float], end: Optional[float]) -> List[Dict[str, Any]]:
+        """
+        Return the non-empty buckets overlapping [start, end), oldest first.
+
+        Returns:
+            One dictionary per bucket with its start and end (UTC epoch
+            seconds), contract count, notional and contracts by status
+        """
+        histogram = self.histograms[granularity]
+        with self._lock:
+            low, high = histogram.span(start, end)
+            rows = [
+                (bucket, count, notional, dict(statuses))
+                for bucket, (count, notional, statuses) in zip(histogram.starts[low:high], histogram.buckets[low:high])
+            ]
+        return [
+            {
+                "start": bucket,
+                "end": bucket_end(bucket, granularity),
+                "contracts": count,
+                "notional": notional,
+                "by_status": statuses
+            }
+            for bucket, count, notional, statuses in rows
+        ]
+
+    def bucket_blocks(self, granularity: str, start: float, offset: int, limit: int) -> Tuple[List[int], Optional[int]]:
+        """
+        Return one page of the contracts in the bucket holding `start`, in time order.
+
+        Returns:
+            Tuple of (block indexes, offset of the next page or None on the last page)
+        """
+        bucket = bucket_start(start, granularity)
+        with self._lock:
+            low = bisect_left(self.timestamps, bucket)
+            high = bisect_left(self.timestamps, bucket_end(bucket, granularity))
+            first = low + offset
+            indexes = list(self.indexes[first:min(first + limit, high)])
+        next_offset = offset + limit if first + limit < high else None
+        return indexes, next_offset
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import config
+
+
+class CachedClaims:
+    """Verified claims of a bearer token, and the user it resolved to once looked up."""
+    __slots__ = ("expires_at", "claims", "principal")
+
+    def __init__(self, expires_at: float, claims: Dict[str, Any]):
+        self.expires_at = expires_at
+        self.claims = claims
+        self.principal: Any = None
+
+
+class ClaimsCache:
+    """
+    Bounded LRU cache from bearer token digest to its verified claims.
+
+    Only tokens that decoded and verified successfully are added, and each
+    entry is dropped once the token's `exp` time passes, so a cache hit is
+    exactly as valid as a fresh `jwt.decode`. Tokens are keyed by their
+    SHA-256 digest rather than kept in memory.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        """
+        Args:
+            max_entries: Maximum number of cached tokens (0 disables caching)
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, CachedClaims]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[CachedClaims]:
+        """Return the cached claims of a token, or None if it is not cached or has expired."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, token: str, claims: Dict[str, Any]) -> CachedClaims:
+        """
+        Cache the verified claims of a token until its `exp` time.
+
+        Returns:
+            The cache entry; tokens without an `exp` claim are returned uncached
+        """
+        entry = CachedClaims(claims.get("exp", 0), claims)
+        if self.max_entries <= 0 or entry.expires_at <= time.time():
+            return entry
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        """Forget every cached token."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size of the cache and its hit rate since startup."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+claims_cache = ClaimsCache(config.CLAIMS_CACHE_SIZE)
@@ -0,0 +1,135 @@
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from block_store import BlockStore
+from search_index import SearchIndex
+
+# A node is ("user", user_id) or ("bond", block_index)
+Node = Tuple[str, int]
+
+# Candidates gathered before a layer is sorted by degree: this many per free
+# slot, and no fewer than MIN_LAYER_CANDIDATES
+CANDIDATES_PER_SLOT = 4
+MIN_LAYER_CANDIDATES = 1024
+
+
+class TransactionGraph:
+    """
+    Bipartite graph of users and the bonds they issued or bought.
+
+    Edges go from an issuer to each of its bonds ("issues") and from a buyer
+    to each bond it bought ("buys"); buyer 0, the placeholder for bonds not
+    yet sold, is left out. The graph is not stored separately: a user's
+    edges are its posting lists in the search index and a bond's edges are
+    its issuer_id and buyer_id, so it is up to date after every append.
+    """
+
+    def __init__(self, chain: BlockStore, index: SearchIndex):
+        self.chain = chain
+        self.index = index
+
+    def degree(self, node: Node) -> int:
+        """Return the number of edges of a node."""
+        kind, key = node
+        if kind == "bond":
+            return 1 if self.chain[key].buyer_id == 0 else 2
+        return len(self.index.by_issuer.get(key, ())) + len(self.index.by_buyer.get(key, ()))
+
+    def neighbours(self, node: Node) -> Iterator[Node]:
+        """Yield the nodes linked to a node, in chain order for a user's bonds."""
+        kind, key = node
+        if kind == "bond":
+            block = self.chain[key]
+            yield ("user", block.issuer_id)
+            if block.buyer_id != 0:
+                yield ("user", block.buyer_id)
+            return
+        for index in self.index.by_issuer.get(key, ()):
+            yield ("bond", index)
+        if key != 0:
+            for index in self.index.by_buyer.get(key, ()):
+                yield ("bond", index)
+
+    def users(self) -> List[Node]:
+        """Return every user with at least one edge."""
+        # list() copies the keys in one step, as the writer may be adding users
+        user_ids = set(list(self.index.by_issuer)) | set(list(self.index.by_buyer))
+        user_ids.discard(0)
+        return [("user", user_id) for user_id in user_ids]
+
+    def subgraph(
+        self,
+        center: Optional[Node] = None,
+        hops: int = 2,
+        max_nodes: int = 500,
+        max_edges: int = 2000
+    ) -> Dict[str, Any]:
+        """
+        Return the neighbourhood of a node, or the whole graph, within node and edge caps.
+
+        The graph is walked breadth first from `center` for `hops` steps
+        (without a center, from every user, so one hop covers the whole
+        graph). When a layer does not fit in the remaining node budget it is
+        filled with its highest-degree nodes, drawn from the neighbours of
+        the highest-degree nodes of the previous layer.
+
+        Returns:
+            Dictionary with the nodes (kind, key and degree, in walk order),
+            the edges between them (user, bond, "issues" or "buys") and
+            whether any node or edge was left out
+        """
+        by_degree = lambda node: (-self.degree(node), node)
+        layer = [center] if center is not None else sorted(self.users(), key=by_degree)
+        truncated = len(layer) > max_nodes
+        layer = layer[:max_nodes]
+        seen: Set[Node] = set(layer)
+        nodes = list(layer)
+
+        for _ in range(hops):
+            remaining = max_nodes - len(nodes)
+            if not layer:
+                break
+            if remaining <= 0:
+                truncated = truncated or any(
+                    neighbour not in seen for node in layer for neighbour in self.neighbours(node)
+                )
+                break
+
+            # Gather a bounded number of candidates, highest-degree parents first
+            limit = max(remaining * CANDIDATES_PER_SLOT, MIN_LAYER_CANDIDATES)
+            candidates: List[Node] = []
+            for node in layer:
+                for neighbour in self.neighbours(node):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        candidates.append(neighbour)
+                        if len(candidates) > limit:
+                            break
+                if len(candidates) > limit:
+                    break
+
+            candidates.sort(key=by_degree)
+            if len(candidates) > remaining:
+                truncated = True
+                candidates = candidates[:remaining]
+            nodes.extend(candidates)
+            layer = candidates
+
+        included = set(nodes)
+        edges: List[Tuple[int, int, str]] = []
+        for kind, key in nodes:
+            if kind != "bond":
+                continue
+            block = self.chain[key]
+            for user_id, relation in ((block.issuer_id, "issues"), (block.buyer_id, "buys")):
+                if user_id != 0 and ("user", user_id) in included:
+                    edges.append((user_id, key, relation))
+            if len(edges) > max_edges:
+                truncated = True
+                del edges[max_edges:]
+                break
+
+        return {
+            "nodes": [(kind, key, self.degree((kind, key))) for kind, key in nodes],
+            "edges": edges,
+            "truncated": truncated
+        }
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import config
+from models import User, UserRole
+
+
+class CachedUser(NamedTuple):
+    """Detached copy of the public columns of a User row."""
+    id: int
+    username: str
+    role: UserRole
+
+
+class UserCache:
+    """
+    Bounded LRU cache of User rows with a time-to-live.
+
+    Entries are looked up by id or by username and are copied out of the
+    session that loaded them, so they can be shared across requests. Users
+    that do not exist are cached too (as None) until they register, which
+    must call `invalidate`. Changes made by other processes become visible
+    once the entry expires.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 300.0):
+        """
+        Args:
+            max_entries: Maximum number of cached lookups; the least recently used go first
+            ttl_seconds: How long a cached lookup stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, Any], Tuple[float, Optional[CachedUser]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so lookups that raced with one are not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Tuple[str, Any]) -> Tuple[bool, Optional[CachedUser]]:
+        """Return (found, user) for a key, dropping it if it expired. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def _store(self, key: Tuple[str, Any], user: Optional[CachedUser]) -> None:
+        """Cache a lookup result, evicting the least recently used entries. Caller holds the lock."""
+        self._entries[key] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _remember(self, user: CachedUser) -> None:
+        """Cache a user under both its id and its username. Caller holds the lock."""
+        self._store(("id", user.id), user)
+        self._store(("username", user.username), user)
+
+    def get_by_id(self, db: Session, user_id: int) -> Optional[CachedUser]:
+        """Return the user with the given id, or None if there is none."""
+        return self.get_many(db, [user_id])[user_id]
+
+    def get_by_username(self, db: Session, username: str) -> Optional[CachedUser]:
+        """Return the user with the given username, or None if there is none."""
+        with self._lock:
+            found, user = self._lookup(("username", username))
+            generation = self._generation
+        if found:
+            return user
+
+        row = db.query(User).filter(User.username == username).first()
+        user = CachedUser(row.id, row.username, row.role) if row else None
+        with self._lock:
+            if generation == self._generation:
+                if user is None:
+                    self._store(("username", username), None)
+                else:
+                    self._remember(user)
+        return user
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, Optional[CachedUser]]:
+        """
+        Return the users with the given ids, loading every uncached one in a single IN query.
+
+        Returns:
+            Dictionary mapping each requested id to its user, or None if there is none
+        """
+        users: Dict[int, Optional[CachedUser]] = {}
+        missing = []
+        with self._lock:
+            for user_id in set(user_ids):
+                found, user = self._lookup(("id", user_id))
+                if found:
+                    users[user_id] = user
+                else:
+                    missing.append(user_id)
+            generation = self._generation
+
+        if missing:
+            rows = db.query(User).filter(User.id.in_(missing)).all()
+            loaded = {row.id: CachedUser(row.id, row.username, row.role) for row in rows}
+            with self._lock:
+                for user_id in missing:
+                    user = loaded.get(user_id)
+                    users[user_id] = user
+                    if generation != self._generation:
+                        continue
+                    if user is None:
+                        self._store(("id", user_id), None)
+                    else:
+                        self._remember(user)
+
+        return users
+
+    def invalidate(self, user_id: Optional[int] = None, username: Optional[str] = None) -> None:
+        """Forget the cached lookups of a user, e.g. after it registered or changed."""
+        with self._lock:
+            self._generation += 1
+            if user_id is not None:
+                self._entries.pop(("id", user_id), None)
+            if username is not None:
+                self._entries.pop(("username", username), None)
+
+    def clear(self) -> None:
+        """Forget every cached lookup."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+# Shared by the API endpoints and the blockchain's user validation
+user_cache = UserCache(config.USER_CACHE_SIZE, config.USER_CACHE_TTL_SECONDS)
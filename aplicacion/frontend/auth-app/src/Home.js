@@ -31,20 +31,6 @@ function HomePage() {
   const [users, setUsers] = useState({});
   const [activeTab, setActiveTab] = useState('table');
   
-  // Function to fetch user data by ID
-  const fetchUserData = async (userId) => {
-    try {
-      const response = await fetch(`${process.env.REACT_APP_API_URL}/users/${userId}`);
-      if (!response.ok) {
-        return { username: `User ${userId}`, role: 'unknown' };
-      }
-      return await response.json();
-    } catch (error) {
-      console.error(`Error fetching user ${userId}:`, error);
-      return { username: `User ${userId}`, role: 'unknown' };
-    }
-  };
-  
   useEffect(() => {
     const fetchTransactions = async () => {
       setLoading(true);
@@ -53,32 +39,16 @@ function HomePage() {
         const token = localStorage.getItem('token');
         setIsAuthenticated(!!token);
         
-        // Fetch transactions from public endpoint
-        const response = await fetch(`${process.env.REACT_APP_API_URL}/contracts/public`);
+        // Fetch transactions from public endpoint, with their users embedded
+        const response = await fetch(`${process.env.REACT_APP_API_URL}/contracts/public?expand=users`);
         
         if (!response.ok) {
           throw new Error('Failed to fetch blockchain transactions');
         }
         
         const data = await response.json();
-        setTransactions(data);
-        
-        // Collect unique user IDs from transactions
-        const userIds = new Set();
-        data.forEach(tx => {
-          userIds.add(tx.issuer_id);
-          userIds.add(tx.buyer_id);
-        });
-        
-        // Fetch user data for each unique ID
-        const userDataPromises = Array.from(userIds).map(async id => {
-          const userData = await fetchUserData(id);
-          return [id, userData];
-        });
-        
-        const userDataEntries = await Promise.all(userDataPromises);
-        const userDataMap = Object.fromEntries(userDataEntries);
-        setUsers(userDataMap);
+        setTransactions(data.contracts);
+        setUsers(data.users);
       } catch (err) {
         setError(err.message);
       } finally {
@@ -190,9 +160,9 @@ function HomePage() {
     
     switch (activeTab) {
       case 'graph':
-        return <TransactionGraph transactions={transactions} users={users} />;
+        return <TransactionGraph />;
       case 'timeline':
-        return <TransactionTimeline transactions={transactions} users={users} />;
+        return <TransactionTimeline users={users} />;
       case 'table':
       default:
         return renderTableView();
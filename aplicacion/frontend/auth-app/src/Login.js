@@ -41,6 +41,7 @@ function Login() {
       if (response.ok) {
         const data = await response.json();
         localStorage.setItem('token', data.access_token);
+        localStorage.setItem('refresh_token', data.refresh_token);
         navigate('/transacciones');
       } else {
         const errorData = await response.json();
@@ -1,11 +1,16 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 
+// Number of contracts requested per page from the API
+const CONTRACTS_PAGE_SIZE = 500;
+
 function ProtectedPage() {
   const navigate = useNavigate();
   const [userData, setUserData] = useState(null);
   const [loading, setLoading] = useState(true);
-  const [availableBonds, setAvailableBonds] = useState([]);
+  const [bondsForSale, setBondsForSale] = useState([]);
+  const [purchasedBonds, setPurchasedBonds] = useState([]);
+  const [issuedBonds, setIssuedBonds] = useState([]);
   const [error, setError] = useState(null);
   const [userRole, setUserRole] = useState(null);
   const [users, setUsers] = useState({});
@@ -24,33 +29,46 @@ function ProtectedPage() {
     type: '' // 'success' or 'error'
   });
   
-  // Function to fetch user data by ID
-  const fetchUserData = async (userId) => {
-    try {
-      const response = await fetch(`${process.env.REACT_APP_API_URL}/users/${userId}`);
-      if (!response.ok) {
-        return { username: `User ${userId}`, role: 'unknown' };
-      }
-      return await response.json();
-    } catch (error) {
-      console.error(`Error fetching user ${userId}:`, error);
-      return { username: `User ${userId}`, role: 'unknown' };
+  // Exchange the stored refresh token for a new access token (and a rotated refresh token)
+  const refreshAccessToken = async () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+      return null;
     }
+    
+    const response = await fetch(`${process.env.REACT_APP_API_URL}/token/refresh`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ refresh_token: refreshToken })
+    });
+    if (!response.ok) {
+      return null;
+    }
+    
+    const data = await response.json();
+    localStorage.setItem('token', data.access_token);
+    localStorage.setItem('refresh_token', data.refresh_token);
+    return data.access_token;
   };
 
   useEffect(() => {
     const verifyToken = async () => {
-      const token = localStorage.getItem('token');
+      let token = localStorage.getItem('token');
       if (!token) {
         navigate('/login');
         return;
       }
 
       try {
-        // Verify token
+        // Verify token, renewing it without a new login once it has expired
         const tokenResponse = await fetch(`${process.env.REACT_APP_API_URL}/verify-token/${token}`);
         if (!tokenResponse.ok) {
-          throw new Error('Token verification failed');
+          token = await refreshAccessToken();
+          if (!token) {
+            throw new Error('Token verification failed');
+          }
         }
         
         // Get user data
@@ -68,11 +86,12 @@ function ProtectedPage() {
         setUserData(userData);
         setUserRole(userData.role);
         
-        // Fetch available bonds
-        fetchAvailableBonds();
+        // Fetch available bonds and the user's own bonds
+        fetchBonds(userData);
       } catch (error) {
         console.error("Authentication error:", error);
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         navigate('/login');
       } finally {
         setLoading(false);
@@ -82,10 +101,19 @@ function ProtectedPage() {
     verifyToken();
   }, [navigate]);
   
-  const fetchAvailableBonds = async () => {
-    try {
-      const token = localStorage.getItem('token');
-      const response = await fetch(`${process.env.REACT_APP_API_URL}/contracts/`, {
+  // Fetch every page of a contracts listing, using the cursor returned in
+  // X-Next-Cursor; each page embeds the users it references
+  const fetchAllPages = async (path, token) => {
+    const contracts = [];
+    const userDataMap = {};
+    let cursor = null;
+    do {
+      const params = new URLSearchParams({ limit: CONTRACTS_PAGE_SIZE, expand: 'users' });
+      if (cursor !== null) {
+        params.set('cursor', cursor);
+      }
+      
+      const response = await fetch(`${process.env.REACT_APP_API_URL}${path}?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
@@ -95,24 +123,58 @@ function ProtectedPage() {
         throw new Error('Failed to fetch bonds');
       }
       
-      const bonds = await response.json();
-      setAvailableBonds(bonds);
+      const page = await response.json();
+      contracts.push(...page.contracts);
+      Object.assign(userDataMap, page.users);
+      cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor !== null);
+    
+    return { contracts, users: userDataMap };
+  };
+  
+  const fetchBonds = async (user) => {
+    try {
+      const token = localStorage.getItem('token');
       
-      // Collect unique user IDs from bonds
-      const userIds = new Set();
-      bonds.forEach(bond => {
-        userIds.add(bond.issuer_id);
-        userIds.add(bond.buyer_id);
-      });
+      // Bonds still for sale come from the server's ownership index
+      const available = await fetchAllPages('/contracts/available', token);
+      const userDataMap = { ...available.users };
+      setBondsForSale(available.contracts);
       
-      // Fetch user data for each unique ID
-      const userDataPromises = Array.from(userIds).map(async id => {
-        const userData = await fetchUserData(id);
-        return [id, userData];
-      });
+      if (user.role === 'buyer') {
+        const holdings = await fetchAllPages(`/users/${user.id}/holdings`, token);
+        Object.assign(userDataMap, holdings.users);
+        setPurchasedBonds(holdings.contracts);
+      }
+      
+      if (user.role === 'issuer') {
+        const response = await fetch(`${process.env.REACT_APP_API_URL}/contracts/search`, {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+          },
+          body: JSON.stringify({ issuer_id: user.id })
+        });
+        if (!response.ok) {
+          throw new Error('Failed to fetch issued bonds');
+        }
+        const issued = await response.json();
+        setIssuedBonds(issued);
+        
+        // Look up the buyers of the issued bonds not seen yet
+        const missing = [...new Set(issued.map(bond => bond.buyer_id))]
+          .filter(id => !userDataMap[id]);
+        if (missing.length > 0) {
+          const usersResponse = await fetch(`${process.env.REACT_APP_API_URL}/users?ids=${missing.join(',')}`);
+          if (usersResponse.ok) {
+            for (const buyer of await usersResponse.json()) {
+              userDataMap[buyer.id] = buyer;
+            }
+          }
+        }
+      }
       
-      const userDataEntries = await Promise.all(userDataPromises);
-      const userDataMap = Object.fromEntries(userDataEntries);
       setUsers(userDataMap);
     } catch (error) {
       setError(error.message);
@@ -179,7 +241,7 @@ function ProtectedPage() {
       });
       
       // Refresh the list of available bonds
-      fetchAvailableBonds();
+      fetchBonds(userData);
     } catch (error) {
       setTransactionStatus({
         message: `Error: ${error.message}`,
@@ -199,7 +261,7 @@ function ProtectedPage() {
       });
       
       // Get the bond details
-      const bond = availableBonds.find(b => b.index === bondId);
+      const bond = bondsForSale.find(b => b.index === bondId);
       
       // Create a new contract with the buyer information
       const response = await fetch(`${process.env.REACT_APP_API_URL}/contracts/`, {
@@ -235,7 +297,7 @@ function ProtectedPage() {
       });
       
       // Refresh the list of available bonds
-      fetchAvailableBonds();
+      fetchBonds(userData);
     } catch (error) {
       setTransactionStatus({
         message: `Error: ${error.message}`,
@@ -253,22 +315,6 @@ function ProtectedPage() {
     return dateString;
   };
   
-  // Filter bonds that are available for purchase (those with buyer_id = 0 or metadata.status = 'available')
-  const bondsForSale = availableBonds.filter(bond => 
-    bond.buyer_id === 0 || 
-    (bond.metadata && bond.metadata.status === 'available')
-  );
-  
-  // Filter bonds that the current user has purchased
-  const purchasedBonds = userRole === 'buyer' ? availableBonds.filter(bond => 
-    bond.buyer_id === userData.id
-  ) : [];
-  
-  // Filter bonds that the current user has issued
-  const issuedBonds = userRole === 'issuer' ? availableBonds.filter(bond => 
-    bond.issuer_id === userData.id
-  ) : [];
-
   return (
     <div style={{ margin: '20px', padding: '20px', fontFamily: 'Arial, sans-serif' }}>
       <h1>Transaction Portal</h1>
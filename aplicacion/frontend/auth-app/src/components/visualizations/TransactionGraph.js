@@ -98,8 +98,22 @@ const NoDataMessage = styled.div`
   font-style: italic;
 `;
 
-const TransactionGraph = ({ transactions, users }) => {
+// Largest graph drawn at once; the server keeps the best-connected nodes
+const MAX_NODES = 500;
+const MAX_EDGES = 2000;
+// Steps around the focused user or bond
+const FOCUS_HOPS = 2;
+
+const BOND_COLORS = {
+  compliant: '#4CAF50', // Green
+  non_compliant: '#f44336', // Red
+  under_review: '#FF9800', // Orange
+};
+
+const TransactionGraph = () => {
   const [graphData, setGraphData] = useState({ nodes: [], links: [] });
+  const [focus, setFocus] = useState(null);
+  const [truncated, setTruncated] = useState(false);
   const [dimensions, setDimensions] = useState({ width: 800, height: 500 });
   const [tooltip, setTooltip] = useState({ visible: false, node: null, x: 0, y: 0 });
   const containerRef = useRef(null);
@@ -125,86 +139,62 @@ const TransactionGraph = ({ transactions, users }) => {
     return () => window.removeEventListener('resize', updateDimensions);
   }, []);
 
-  // Transform transaction data into graph format
+  // Fetch the graph (or the neighbourhood of the focused node) from the server
   useEffect(() => {
-    if (!transactions || !users) return;
+    const params = new URLSearchParams({ max_nodes: MAX_NODES, max_edges: MAX_EDGES });
+    if (focus) {
+      params.set(focus.type === 'bond' ? 'bond_id' : 'user_id', focus.key);
+      params.set('hops', FOCUS_HOPS);
+    }
 
-    // Transform the transactions data into a graph structure
-    const nodes = [];
-    const links = [];
-    const nodeIds = new Set();
+    let cancelled = false;
+    const fetchGraph = async () => {
+      try {
+        const response = await fetch(`${process.env.REACT_APP_API_URL}/graph?${params}`);
+        if (!response.ok) {
+          throw new Error('Failed to fetch transaction graph');
+        }
+        const data = await response.json();
+        if (cancelled) return;
 
-    // Create nodes for all users first (issuers and buyers)
-    Object.entries(users).forEach(([id, userData]) => {
-      const userId = parseInt(id);
-      if (userId === 0) return; // Skip the placeholder "Available" user (buyer_id: 0)
-      
-      if (!nodeIds.has(`user-${userId}`)) {
-        nodes.push({
-          id: `user-${userId}`,
-          name: userData.username || `User ${userId}`,
-          type: userData.role?.toLowerCase() || 'unknown',
-          color: userData.role?.toLowerCase() === 'issuer' ? '#4CAF50' : '#2196F3',
-          size: 15,
-          val: 20, // Influence node size in force-directed layout
-        });
-        nodeIds.add(`user-${userId}`);
-      }
-    });
+        // The server sends the nodes and links; only their styling is added here
+        const nodes = data.nodes.map(node => node.type === 'bond'
+          ? {
+              ...node,
+              color: BOND_COLORS[node.status] || '#FFC107', // Default yellow (pending)
+              size: 10,
+              val: 15, // Influence node size in force-directed layout
+            }
+          : {
+              ...node,
+              color: node.type === 'issuer' ? '#4CAF50' : '#2196F3',
+              size: 15,
+              val: 20, // Influence node size in force-directed layout
+            });
+        const links = data.links.map(link => ({
+          ...link,
+          color: link.type === 'issues' ? '#4CAF50' : '#2196F3',
+        }));
 
-    // Create nodes for bonds and establish links
-    transactions.forEach(tx => {
-      const bondNodeId = `bond-${tx.index}`;
-      
-      // Add bond node
-      if (!nodeIds.has(bondNodeId)) {
-        // Determine bond color based on status
-        let bondColor = '#FFC107'; // Default yellow
-        if (tx.compliance_status === 'compliant') {
-          bondColor = '#4CAF50'; // Green
-        } else if (tx.compliance_status === 'non_compliant') {
-          bondColor = '#f44336'; // Red
-        } else if (tx.compliance_status === 'under_review') {
-          bondColor = '#FF9800'; // Orange
-        }
-        
-        nodes.push({
-          id: bondNodeId,
-          name: `Bond #${tx.index}`,
-          amount: tx.bond_amount,
-          status: tx.compliance_status,
-          maturity: tx.maturity_date,
-          yield: tx.yield_rate,
-          hash: tx.hash,
-          type: 'bond',
-          color: bondColor,
-          size: 10,
-          val: 15, // Influence node size in force-directed layout
-        });
-        nodeIds.add(bondNodeId);
+        setGraphData({ nodes, links });
+        setTruncated(data.truncated);
+      } catch (error) {
+        console.error('Error fetching transaction graph:', error);
       }
+    };
 
-      // Link issuer to bond
-      links.push({
-        source: `user-${tx.issuer_id}`,
-        target: bondNodeId,
-        type: 'issues',
-        color: '#4CAF50',
-      });
+    fetchGraph();
+    return () => { cancelled = true; };
+  }, [focus]);
 
-      // Link buyer to bond (if the bond has been purchased)
-      if (tx.buyer_id !== 0) {
-        links.push({
-          source: `user-${tx.buyer_id}`,
-          target: bondNodeId,
-          type: 'buys',
-          color: '#2196F3',
-        });
-      }
+  // Clicking a node shows the neighbourhood around it
+  const handleNodeClick = (node) => {
+    setFocus({
+      type: node.type === 'bond' ? 'bond' : 'user',
+      key: node.type === 'bond' ? node.index : node.user_id,
+      name: node.name,
     });
-
-    setGraphData({ nodes, links });
-  }, [transactions, users]);
+  };
 
   // Function to format currency
   const formatCurrency = (amount) => {
@@ -282,9 +272,19 @@ const TransactionGraph = ({ transactions, users }) => {
       
       <GraphControls>
         <StyledButton onClick={handleZoomToFit}>Zoom to Fit</StyledButton>
+        {focus && (
+          <StyledButton onClick={() => setFocus(null)}>Show Whole Graph</StyledButton>
+        )}
         <StyledButton onClick={handleCenterGraph}>Center Graph</StyledButton>
       </GraphControls>
       
+      <GraphDescription>
+        {focus
+          ? `Showing everything within ${FOCUS_HOPS} steps of ${focus.name}.`
+          : 'Click a user or bond to show its neighbourhood.'}
+        {truncated && ` Only the ${MAX_NODES} best-connected nodes are shown.`}
+      </GraphDescription>
+      
       <GraphDisplay ref={containerRef}>
         {graphData.nodes.length > 0 ? (
           <>
@@ -303,6 +303,7 @@ const TransactionGraph = ({ transactions, users }) => {
               linkColor={link => link.color}
               linkWidth={1.5}
               onNodeHover={handleNodeHover}
+              onNodeClick={handleNodeClick}
               cooldownTicks={100}
               nodeCanvasObject={(node, ctx, globalScale) => {
                 const label = node.name;
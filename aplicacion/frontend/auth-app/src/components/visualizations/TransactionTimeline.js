@@ -1,4 +1,4 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import styled from 'styled-components';
 
 const TimelineContainer = styled.div`
@@ -129,129 +129,264 @@ const HashValue = styled.span`
   cursor: help;
 `;
 
-const TransactionTimeline = ({ transactions, users }) => {
-  // Sort transactions by timestamp (newest first)
-  const sortedTransactions = [...transactions].sort((a, b) => {
-    return new Date(b.timestamp) - new Date(a.timestamp);
-  });
+const BucketSummary = styled.div`
+  display: flex;
+  flex-wrap: wrap;
+  align-items: center;
+  gap: 10px;
+`;
+
+const LinkButton = styled.button`
+  background: none;
+  border: none;
+  color: #2e7d32;
+  cursor: pointer;
+  font-size: 0.9rem;
+  padding: 0;
+  margin-top: 10px;
+  text-decoration: underline;
+`;
+
+// Transactions fetched per page when a bucket is opened
+const PAGE_SIZE = 50;
+// Most buckets shown at once; the server picks the finest granularity that fits
+const MAX_BUCKETS = 200;
+
+const API_URL = process.env.REACT_APP_API_URL;
+
+const formatDate = (dateString) => {
+  if (!dateString) return 'N/A';
   
-  const formatDate = (dateString) => {
-    if (!dateString) return 'N/A';
-    
-    const date = new Date(dateString);
-    return new Intl.DateTimeFormat('en-US', {
-      year: 'numeric',
-      month: 'long',
-      day: 'numeric',
-      hour: '2-digit',
-      minute: '2-digit'
-    }).format(date);
+  const date = new Date(dateString);
+  return new Intl.DateTimeFormat('en-US', {
+    year: 'numeric',
+    month: 'long',
+    day: 'numeric',
+    hour: '2-digit',
+    minute: '2-digit'
+  }).format(date);
+};
+
+const formatCurrency = (amount) => {
+  return new Intl.NumberFormat('en-US', {
+    style: 'currency',
+    currency: 'USD'
+  }).format(amount);
+};
+
+// Bucket starts are UTC epoch seconds; label them at the bucket's granularity
+const formatBucket = (start, granularity) => {
+  const options = { year: 'numeric', month: 'long', timeZone: 'UTC' };
+  if (granularity !== 'month') options.day = 'numeric';
+  if (granularity === 'hour' || granularity === 'minute') {
+    options.hour = '2-digit';
+    options.minute = '2-digit';
+  }
+  return new Intl.DateTimeFormat('en-US', options).format(new Date(start * 1000));
+};
+
+// The status most of a bucket's contracts are in picks its colour
+const dominantStatus = (byStatus) =>
+  Object.entries(byStatus).sort((a, b) => b[1] - a[1])[0]?.[0];
+
+const TransactionItem = ({ tx, users }) => (
+    <TimelineItem $status={tx.compliance_status}>
+      <TimelineDate>{formatDate(tx.timestamp)}</TimelineDate>
+      
+      <TimelineTitle>
+        Bond #{tx.index}
+        <StatusBadge $status={tx.compliance_status}>
+          {tx.compliance_status.replace('_', ' ')}
+        </StatusBadge>
+      </TimelineTitle>
+      
+      <TimelineContent>
+        <Detail>
+          <Label>Issuer:</Label>
+          <Value>
+            {users[tx.issuer_id] 
+              ? users[tx.issuer_id].username 
+              : `User ${tx.issuer_id}`}
+          </Value>
+        </Detail>
+        
+        <Detail>
+          <Label>Buyer:</Label>
+          <Value>
+            {tx.buyer_id === 0
+              ? "Available for purchase"
+              : users[tx.buyer_id]
+                ? users[tx.buyer_id].username
+                : `User ${tx.buyer_id}`}
+          </Value>
+        </Detail>
+        
+        <Detail>
+          <Label>Bond Amount:</Label>
+          <Value>{formatCurrency(tx.bond_amount)}</Value>
+        </Detail>
+        
+        {tx.maturity_date && (
+          <Detail>
+            <Label>Maturity Date:</Label>
+            <Value>{tx.maturity_date}</Value>
+          </Detail>
+        )}
+        
+        {tx.yield_rate && (
+          <Detail>
+            <Label>Yield Rate:</Label>
+            <Value>{tx.yield_rate}%</Value>
+          </Detail>
+        )}
+        
+        {tx.hash && (
+          <Detail>
+            <Label>Transaction:</Label>
+            <Value>
+              <HashValue title={tx.hash}>
+                {tx.hash.substring(0, 16)}...
+              </HashValue>
+            </Value>
+          </Detail>
+        )}
+        
+        {tx.comment && (
+          <Detail>
+            <Label>Comment:</Label>
+            <Value>{tx.comment}</Value>
+          </Detail>
+        )}
+        
+        {tx.compliance_history && tx.compliance_history.length > 0 && (
+          <Detail>
+            <Label>History:</Label>
+            <Value>
+              {tx.compliance_history.map((entry, idx) => (
+                <div key={idx} style={{ fontSize: '0.9em', marginBottom: '5px' }}>
+                  {entry.timestamp.substring(0, 10)} - Status changed to{' '}
+                  <strong>{entry.new_status.replace('_', ' ')}</strong>
+                  {entry.reason && <em> (Reason: {entry.reason})</em>}
+                </div>
+              ))}
+            </Value>
+          </Detail>
+        )}
+      </TimelineContent>
+    </TimelineItem>);
+
+const TimelineBucket = ({ bucket, granularity, users }) => {
+  const [transactions, setTransactions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [open, setOpen] = useState(false);
+  const [loading, setLoading] = useState(false);
+
+  const loadPage = async (cursor) => {
+    setLoading(true);
+    try {
+      const params = new URLSearchParams({ granularity, bucket: bucket.start, cursor, limit: PAGE_SIZE });
+      const response = await fetch(`${API_URL}/timeline/blocks?${params}`);
+      if (!response.ok) {
+        throw new Error('Failed to fetch bucket transactions');
+      }
+      const page = await response.json();
+      setTransactions(previous => cursor === 0 ? page : [...previous, ...page]);
+      setNextCursor(response.headers.get('X-Next-Cursor'));
+    } catch (error) {
+      console.error('Error fetching bucket transactions:', error);
+    } finally {
+      setLoading(false);
+    }
   };
-  
-  const formatCurrency = (amount) => {
-    return new Intl.NumberFormat('en-US', {
-      style: 'currency',
-      currency: 'USD'
-    }).format(amount);
+
+  const toggle = () => {
+    if (!open && transactions.length === 0) {
+      loadPage(0);
+    }
+    setOpen(!open);
   };
+
+  return (
+    <TimelineItem $status={dominantStatus(bucket.by_status)}>
+      <TimelineDate>{formatBucket(bucket.start, granularity)}</TimelineDate>
+      
+      <TimelineTitle>
+        {bucket.contracts} {bucket.contracts === 1 ? 'bond' : 'bonds'} &middot; {formatCurrency(bucket.notional)}
+      </TimelineTitle>
+      
+      <TimelineContent>
+        <BucketSummary>
+          {Object.entries(bucket.by_status).map(([status, count]) => (
+            <StatusBadge key={status} $status={status}>
+              {count} {status.replace('_', ' ')}
+            </StatusBadge>
+          ))}
+        </BucketSummary>
+        
+        <LinkButton onClick={toggle}>
+          {open ? 'Hide transactions' : 'Show transactions'}
+        </LinkButton>
+        
+        {open && (
+          <TimelineList style={{ marginTop: '20px' }}>
+            {transactions.map(tx => (
+              <TransactionItem key={tx.index} tx={tx} users={users} />
+            ))}
+          </TimelineList>
+        )}
+        
+        {open && nextCursor && (
+          <LinkButton onClick={() => loadPage(Number(nextCursor))} disabled={loading}>
+            {loading ? 'Loading...' : 'Load more'}
+          </LinkButton>
+        )}
+      </TimelineContent>
+    </TimelineItem>
+  );
+};
+
+const TransactionTimeline = ({ users }) => {
+  const [timeline, setTimeline] = useState({ granularity: null, buckets: [] });
+
+  useEffect(() => {
+    const fetchTimeline = async () => {
+      try {
+        const response = await fetch(`${API_URL}/timeline?max_buckets=${MAX_BUCKETS}`);
+        if (!response.ok) {
+          throw new Error('Failed to fetch transaction timeline');
+        }
+        setTimeline(await response.json());
+      } catch (error) {
+        console.error('Error fetching transaction timeline:', error);
+      }
+    };
+    
+    fetchTimeline();
+  }, []);
+  
+  // Newest first
+  const buckets = [...timeline.buckets].reverse();
   
   return (
     <TimelineContainer>
       <TimelineHeader>Transaction Timeline</TimelineHeader>
       <TimelineDescription>
         A chronological view of all bond transactions in the blockchain
+        {timeline.granularity && `, grouped by ${timeline.granularity}`}
       </TimelineDescription>
       
       <TimelineList>
-        {sortedTransactions.map(tx => (
-          <TimelineItem key={tx.index} $status={tx.compliance_status}>
-            <TimelineDate>{formatDate(tx.timestamp)}</TimelineDate>
-            
-            <TimelineTitle>
-              Bond #{tx.index}
-              <StatusBadge $status={tx.compliance_status}>
-                {tx.compliance_status.replace('_', ' ')}
-              </StatusBadge>
-            </TimelineTitle>
-            
-            <TimelineContent>
-              <Detail>
-                <Label>Issuer:</Label>
-                <Value>
-                  {users[tx.issuer_id] 
-                    ? users[tx.issuer_id].username 
-                    : `User ${tx.issuer_id}`}
-                </Value>
-              </Detail>
-              
-              <Detail>
-                <Label>Buyer:</Label>
-                <Value>
-                  {tx.buyer_id === 0
-                    ? "Available for purchase"
-                    : users[tx.buyer_id]
-                      ? users[tx.buyer_id].username
-                      : `User ${tx.buyer_id}`}
-                </Value>
-              </Detail>
-              
-              <Detail>
-                <Label>Bond Amount:</Label>
-                <Value>{formatCurrency(tx.bond_amount)}</Value>
-              </Detail>
-              
-              {tx.maturity_date && (
-                <Detail>
-                  <Label>Maturity Date:</Label>
-                  <Value>{tx.maturity_date}</Value>
-                </Detail>
-              )}
-              
-              {tx.yield_rate && (
-                <Detail>
-                  <Label>Yield Rate:</Label>
-                  <Value>{tx.yield_rate}%</Value>
-                </Detail>
-              )}
-              
-              {tx.hash && (
-                <Detail>
-                  <Label>Transaction:</Label>
-                  <Value>
-                    <HashValue title={tx.hash}>
-                      {tx.hash.substring(0, 16)}...
-                    </HashValue>
-                  </Value>
-                </Detail>
-              )}
-              
-              {tx.comment && (
-                <Detail>
-                  <Label>Comment:</Label>
-                  <Value>{tx.comment}</Value>
-                </Detail>
-              )}
-              
-              {tx.compliance_history && tx.compliance_history.length > 0 && (
-                <Detail>
-                  <Label>History:</Label>
-                  <Value>
-                    {tx.compliance_history.map((entry, idx) => (
-                      <div key={idx} style={{ fontSize: '0.9em', marginBottom: '5px' }}>
-                        {entry.timestamp.substring(0, 10)} - Status changed to{' '}
-                        <strong>{entry.new_status.replace('_', ' ')}</strong>
-                        {entry.reason && <em> (Reason: {entry.reason})</em>}
-                      </div>
-                    ))}
-                  </Value>
-                </Detail>
-              )}
-            </TimelineContent>
-          </TimelineItem>
+        {buckets.map(bucket => (
+          <TimelineBucket
+            key={bucket.start}
+            bucket={bucket}
+            granularity={timeline.granularity}
+            users={users}
+          />
         ))}
       </TimelineList>
     </TimelineContainer>
   );
 };
 
-export default TransactionTimeline;
\ No newline at end of file
+export default TransactionTimeline;
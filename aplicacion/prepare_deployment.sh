@@ -15,7 +15,7 @@ mkdir -p deployment/frontend
 # Copy backend files
 echo -e "${YELLOW}Copying backend files...${NC}"
 cp -r backend/*.py deployment/backend/
-cp backend/requirements.txt deployment/backend/
+cp backend/requirements.txt backend/requirements-postgresql.txt deployment/backend/
 cp backend/Procfile deployment/backend/
 
 # Copy frontend files